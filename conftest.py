@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_teardown(item):
+    """Миниатюры, заказанные тестом, дописываются до того, как фикстуры
+    удалят временный MEDIA_ROOT."""
+    from posts import thumbnails
+
+    thumbnails.wait()
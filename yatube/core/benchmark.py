@@ -0,0 +1,361 @@
+"""Нагрузочные замеры страниц, кэша, сжатия и базы данных.
+
+Замеры базы пишут в нее настоящие посты от имени отдельного
+пользователя и удаляют их по окончании, поэтому запускать их стоит
+на копии базы. Все замеры доступны через команду ``bench``.
+"""
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.signals import request_finished, request_started
+from django.db import OperationalError, connection, connections
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from posts.models import Group, Post, User
+
+from . import compression
+from .cache_backends import CompressedCache, SQLiteCache
+
+BENCHMARK_USERNAME = 'benchmark'
+# Настройки SQLite по умолчанию: журнал отката и полная синхронизация.
+SQLITE_BASELINE = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+# Время жизни постоянного соединения, если в настройках их нет.
+PERSISTENT_AGE = 60
+
+
+def percentile(values, share):
+    """Значение, которого не превышает доля ``share`` замеров."""
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * share), len(ordered) - 1)]
+
+
+def database_profiles():
+    """Профили соединений для текущей базы: имя -> (прагмы SQLite,
+    ``CONN_MAX_AGE``). На PostgreSQL сравниваются соединение на каждый
+    запрос и постоянные соединения."""
+    persistent = connection.settings_dict['CONN_MAX_AGE'] or PERSISTENT_AGE
+    if connection.vendor == 'sqlite':
+        return {
+            'sqlite-baseline': (SQLITE_BASELINE, persistent),
+            'sqlite-tuned': (settings.SQLITE_PRAGMAS, persistent),
+        }
+    return {
+        f'{connection.vendor}-per-request': (settings.SQLITE_PRAGMAS, 0),
+        f'{connection.vendor}-persistent': (
+            settings.SQLITE_PRAGMAS, persistent
+        ),
+    }
+
+
+def set_journal_mode(mode):
+    """Режим журнала SQLite хранится в файле базы, поэтому меняется
+    одним соединением до запуска потоков: смена из всех соединений сразу
+    упирается в «database is locked»."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA journal_mode = {mode}')
+    connection.close()
+
+
+def _worker(operation, deadline, results, barrier):
+    done = errors = 0
+    barrier.wait()
+    try:
+        while time.monotonic() < deadline:
+            # Каждая операция — отдельный запрос: по его окончании
+            # Django закрывает соединения старше CONN_MAX_AGE.
+            request_started.send(sender=__name__)
+            try:
+                operation()
+                done += 1
+            except OperationalError:
+                # «database is locked» и разрывы соединения.
+                errors += 1
+            finally:
+                request_finished.send(sender=__name__)
+    finally:
+        connections.close_all()
+        results.append((done, errors))
+
+
+def _run(operation, count, deadline, barrier):
+    results = []
+    threads = [
+        threading.Thread(
+            target=_worker, args=(operation, deadline, results, barrier)
+        )
+        for _ in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def database_throughput(readers=4, writers=2, seconds=5.0):
+    """Операций в секунду при одновременном чтении ленты и записи постов.
+
+    Возвращает словарь профиль -> показатели.
+    """
+    author, _ = User.objects.get_or_create(username=BENCHMARK_USERNAME)
+
+    def read():
+        list(Post.objects.for_listing()[:settings.POSTS])
+
+    def write():
+        Post.objects.create(author=author, text='Замер производительности')
+
+    report = {}
+    # Настройки соединения общие у всех потоков: новые соединения
+    # берут CONN_MAX_AGE профиля.
+    config = connections.databases[connection.alias]
+    conn_max_age = config['CONN_MAX_AGE']
+    try:
+        for name, (pragmas, age) in database_profiles().items():
+            connections.close_all()
+            config['CONN_MAX_AGE'] = age
+            pragmas = dict(pragmas)
+            journal_mode = pragmas.pop('journal_mode', None)
+            with override_settings(SQLITE_PRAGMAS=pragmas):
+                if connection.vendor == 'sqlite' and journal_mode:
+                    set_journal_mode(journal_mode)
+                barrier = threading.Barrier(readers + writers)
+                deadline = time.monotonic() + seconds
+                read_threads, reads = _run(read, readers, deadline, barrier)
+                write_threads, writes = _run(
+                    write, writers, deadline, barrier
+                )
+                for thread in read_threads + write_threads:
+                    thread.join()
+            report[name] = {
+                'reads_per_second': sum(done for done, _ in reads) / seconds,
+                'writes_per_second': (
+                    sum(done for done, _ in writes) / seconds
+                ),
+                'errors': sum(errors for _, errors in reads + writes),
+            }
+    finally:
+        config['CONN_MAX_AGE'] = conn_max_age
+        connections.close_all()
+        author.delete()
+    return report
+
+
+def cache_profiles(directory):
+    """Настройки кэшей для сравнения с ``LocMemCache``."""
+    locmem = 'django.core.cache.backends.locmem.LocMemCache'
+    profiles = {
+        'locmem': {'BACKEND': locmem, 'LOCATION': 'benchmark'},
+        'locmem-compressed': {
+            'BACKEND': 'core.cache_backends.CompressedCache',
+            'LOCATION': 'benchmark-compressed',
+            'OPTIONS': {'BACKEND': locmem},
+        },
+        'sqlite': {
+            'BACKEND': 'core.cache_backends.CompressedCache',
+            'LOCATION': os.path.join(directory, 'cache.sqlite3'),
+            'OPTIONS': {'BACKEND': 'core.cache_backends.SQLiteCache'},
+        },
+        'file': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(directory, 'cache'),
+        },
+    }
+    configured = settings.CACHES['default']
+    backend = configured.get('OPTIONS', {}).get(
+        'BACKEND', configured['BACKEND']
+    )
+    if backend not in {
+        profile.get('OPTIONS', {}).get('BACKEND', profile['BACKEND'])
+        for profile in profiles.values()
+    }:
+        profiles['configured'] = configured
+    return profiles
+
+
+def stored_bytes(backend):
+    """Сколько байт занимают значения в кэше."""
+    if isinstance(backend, CompressedCache):
+        return stored_bytes(backend.cache)
+    if isinstance(backend, LocMemCache):
+        return sum(len(value) for value in backend._cache.values())
+    if isinstance(backend, SQLiteCache):
+        return backend.stored_bytes()
+    if isinstance(backend, FileBasedCache):
+        return sum(
+            os.path.getsize(name) for name in backend._list_cache_files()
+        )
+    return None
+
+
+def cache_hit_latency(repeat=200):
+    """Задержка ответа из кэша и объем кэша для главной и профиля.
+
+    Возвращает словарь профиль -> показатели; задержки в миллисекундах.
+    """
+    author = User.objects.order_by('-stats__posts').first()
+    urls = [reverse('posts:index')]
+    if author is not None:
+        urls.append(reverse('posts:profile', args=[author.username]))
+    client = Client()
+    report = {}
+    # Панель отладки многократно замедляет ответы при DEBUG.
+    with tempfile.TemporaryDirectory() as directory, override_settings(
+        DEBUG=False
+    ):
+        for name, config in cache_profiles(directory).items():
+            with override_settings(CACHES={'default': config}):
+                backend = caches['default']
+                backend.clear()
+                for url in urls:
+                    client.get(url)
+                result = {'bytes': stored_bytes(backend)}
+                for url in urls:
+                    timings = []
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        client.get(url)
+                        timings.append((time.perf_counter() - start) * 1000)
+                    result[url] = {
+                        'p50_ms': percentile(timings, 0.5),
+                        'p95_ms': percentile(timings, 0.95),
+                    }
+                backend.clear()
+                backend.close()
+            report[name] = result
+    return report
+
+
+def view_targets():
+    """Адреса страниц для замера на самых нагруженных объектах.
+
+    Возвращает список (имя, адрес, нужен ли вход) и пользователя
+    с самой большой лентой подписок.
+    """
+    group = Group.objects.annotate(total=Count('posts')).order_by(
+        '-total'
+    ).first()
+    author = User.objects.order_by('-stats__posts').first()
+    post = Post.objects.order_by('-comments_count').first()
+    reader = User.objects.order_by('-stats__following').first()
+    targets = [('index', reverse('posts:index'), False)]
+    if group is not None:
+        targets.append((
+            'group_posts',
+            reverse('posts:group_list', args=[group.slug]),
+            False
+        ))
+    if author is not None:
+        targets.append((
+            'profile',
+            reverse('posts:profile', args=[author.username]),
+            False
+        ))
+    if post is not None:
+        targets.append((
+            'post_detail',
+            reverse('posts:post_detail', args=[post.pk]),
+            False
+        ))
+    if reader is not None:
+        targets.append(('follow_index', reverse('posts:follow_index'), True))
+    return targets, reader
+
+
+def view_latency(repeat=50, cold=False):
+    """p50/p95 задержки, число запросов и размер ответа главных страниц.
+
+    При ``cold`` кэш очищается перед каждым запросом, иначе страницы
+    замеряются после прогрева. Задержки в миллисекундах.
+    """
+    targets, reader = view_targets()
+    guest = Client()
+    user = Client()
+    if reader is not None:
+        user.force_login(reader)
+    report = {}
+    with override_settings(DEBUG=False):
+        for name, url, login in targets:
+            client = user if login else guest
+            client.get(url)
+            timings = []
+            for _ in range(repeat):
+                if cold:
+                    caches['default'].clear()
+                start = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+            if cold:
+                caches['default'].clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url)
+            report[name] = {
+                'url': url,
+                'status': response.status_code,
+                'p50_ms': percentile(timings, 0.5),
+                'p95_ms': percentile(timings, 0.95),
+                'queries': len(queries.captured_queries),
+                'bytes': len(response.content),
+            }
+    return report
+
+
+def cpu_ms(operation, repeat):
+    """Среднее процессорное время операции в миллисекундах."""
+    start = time.process_time()
+    for _ in range(repeat):
+        operation()
+    return (time.process_time() - start) * 1000 / repeat
+
+
+def compression_cost(repeat=100):
+    """Сколько байт экономит сжатие главных страниц и во что оно
+    обходится процессору.
+
+    Для каждой кодировки: размер ответа, экономия относительно
+    несжатого, процессорное время запроса со сжатым вариантом из кэша
+    и время сжатия страницы без кэша. Время в миллисекундах.
+    """
+    targets, reader = view_targets()
+    guest = Client()
+    user = Client()
+    if reader is not None:
+        user.force_login(reader)
+    report = {}
+    with override_settings(DEBUG=False):
+        for name, url, login in targets:
+            client = user if login else guest
+            body = client.get(url).content
+            result = {
+                'url': url,
+                'identity': {
+                    'bytes': len(body),
+                    'request_cpu_ms': cpu_ms(lambda: client.get(url), repeat),
+                },
+            }
+            for encoding in compression.available():
+                response = client.get(url, HTTP_ACCEPT_ENCODING=encoding)
+                size = len(response.content)
+                result[encoding] = {
+                    'bytes': size,
+                    'saved_bytes': len(body) - size,
+                    'saved_percent': round(100 * (1 - size / len(body)), 1),
+                    'request_cpu_ms': cpu_ms(
+                        lambda: client.get(
+                            url, HTTP_ACCEPT_ENCODING=encoding
+                        ),
+                        repeat
+                    ),
+                    'compress_cpu_ms': cpu_ms(
+                        lambda: compression.compress(body, encoding), repeat
+                    ),
+                }
+            report[name] = result
+    return report
@@ -0,0 +1,138 @@
+"""Версионированные ключи кэша.
+
+Каждая область (``index``, ``group:<pk>``, ...) хранит в кэше номер
+версии, который входит в ключи закэшированных страниц и фрагментов.
+Изменение данных увеличивает версию области, и старые записи больше
+не читаются, а просто вытесняются по TTL. Версия — отметка времени
+в миллисекундах, не меньше времени последнего изменения, поэтому
+``changed_at`` выводит из версий дату для ``Last-Modified``.
+
+``fetch`` защищает дорогие записи от лавины пересчетов, когда запись
+истекает или версия области меняется под нагрузкой:
+
+* пересчитывает запись только один процесс — тот, кто занял
+  блокировку ``cache.add``; остальные ждут его результата;
+* истекшая запись еще ``settings.CACHE_STALE`` секунд отдается
+  остальным, пока владелец блокировки ее пересчитывает;
+* запись пересчитывается немного раньше срока с вероятностью, которая
+  растет к концу срока и с временем пересчета (алгоритм XFetch),
+  поэтому истечение горячих ключей размазано во времени.
+
+Исходы считаются в ``core.metrics`` как ``yatube_cache_fetch_total``:
+``coalesced`` и ``stale`` — пересчеты, которые взял на себя другой
+процесс.
+"""
+import math
+import random
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics, routers
+
+
+def _key(scope):
+    return f'version:{scope}'
+
+
+def _initial():
+    # Версия с отметкой времени не повторяется после сброса кэша,
+    # поэтому уцелевшие фрагменты не совпадут с новой версией.
+    return int(time.time() * 1000)
+
+
+def versions(*scopes):
+    """Строка с текущими версиями областей для ключа кэша."""
+    keys = [_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        # add() не перетирает версию, которую успел записать или
+        # увеличить параллельный bump(), поэтому версия перечитывается.
+        initial = _initial()
+        for key in missing:
+            cache.add(key, initial, None)
+        found.update(cache.get_many(missing))
+        for key in missing:
+            found.setdefault(key, initial)
+    return '.'.join(str(found[key]) for key in keys)
+
+
+def bump(*scopes):
+    """Инвалидирует все записи, построенные на версиях областей.
+
+    Версия догоняет текущее время, а при параллельных вызовах все равно
+    растет на каждый из них.
+    """
+    now = _initial()
+    keys = [_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        try:
+            cache.incr(key, max(1, now - found.get(key, now)))
+        except ValueError:
+            cache.set(key, now, None)
+    routers.invalidate()
+
+
+def changed_at(value):
+    """Время последнего изменения по строке ``versions``."""
+    return datetime.fromtimestamp(
+        max(int(version) for version in value.split('.')) / 1000,
+        timezone.utc
+    )
+
+
+def _recompute(key, compute, timeout):
+    start = time.monotonic()
+    value = compute()
+    delta = time.monotonic() - start
+    cache.set(
+        key,
+        (value, delta, time.time() + timeout),
+        timeout + settings.CACHE_STALE
+    )
+    return value
+
+
+def fetch(key, compute, timeout):
+    """Значение из кэша или ``compute()`` без одновременных пересчетов."""
+    lock = f'lock:{key}'
+    deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+    waited = False
+    while True:
+        entry = cache.get(key)
+        if entry is not None:
+            value, delta, expires = entry
+            # XFetch: log(random()) < 0, поэтому срок сдвигается раньше.
+            early = delta * settings.CACHE_XFETCH_BETA * math.log(
+                1 - random.random()
+            )
+            if time.time() - early < expires:
+                metrics.count_event(
+                    'cache_fetch', 'coalesced' if waited else 'hit'
+                )
+                return value
+        if cache.add(lock, 1, settings.CACHE_LOCK_TIMEOUT):
+            try:
+                value = _recompute(key, compute, timeout)
+            finally:
+                cache.delete(lock)
+            if entry is None:
+                metrics.count_event('cache_fetch', 'miss')
+            elif time.time() < entry[2]:
+                metrics.count_event('cache_fetch', 'early')
+            else:
+                metrics.count_event('cache_fetch', 'expired')
+            return value
+        if entry is not None:
+            # Пересчитывает другой процесс, а этот отдает старое значение.
+            metrics.count_event('cache_fetch', 'stale')
+            return entry[0]
+        if time.monotonic() >= deadline:
+            metrics.count_event('cache_fetch', 'lock_timeout')
+            return _recompute(key, compute, timeout)
+        waited = True
+        time.sleep(settings.CACHE_LOCK_POLL)
@@ -0,0 +1,298 @@
+"""Бэкенды кэша, общие для всех процессов одного сервера.
+
+``SQLiteCache`` хранит записи в отдельном файле SQLite в режиме WAL,
+поэтому его видят все воркеры gunicorn, а инвалидация версиями
+(``core.cache``) работает между процессами. ``CompressedCache``
+сжимает значения перед записью в любой другой бэкенд: Redis, memcached,
+SQLite или память процесса. Целые числа хранятся как есть, чтобы
+``incr`` и ``decr`` выполнялись на стороне бэкенда. Обертка же считает
+попадания и промахи для ``core.metrics``.
+"""
+import pickle
+import random
+import sqlite3
+import threading
+import time
+import zlib
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.module_loading import import_string
+
+from . import metrics, tiered
+
+PICKLED = b'p'
+COMPRESSED = b'z'
+
+
+class CompressedCache(BaseCache):
+    """Обертка, сжимающая значения длиннее ``MIN_LENGTH`` байт.
+
+    Внутренний бэкенд задается в ``OPTIONS['BACKEND']``, остальные
+    параметры передаются ему без изменений.
+    """
+
+    def __init__(self, location, params):
+        options = dict(params.get('OPTIONS', {}))
+        backend = options.pop('BACKEND')
+        self.min_length = options.pop('MIN_LENGTH', 1024)
+        self.level = options.pop('LEVEL', 6)
+        super().__init__({**params, 'OPTIONS': options})
+        self.cache = import_string(backend)(
+            location, {**params, 'OPTIONS': options}
+        )
+
+    def encode(self, value):
+        if type(value) is int:
+            return value
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        # Байтовые строки в кэше уже сжаты, см. ``core.compression``.
+        if (
+            self.min_length is not None
+            and len(data) >= self.min_length
+            and type(value) is not bytes
+        ):
+            return COMPRESSED + zlib.compress(data, self.level)
+        return PICKLED + data
+
+    def decode(self, value):
+        if not isinstance(value, bytes):
+            return value
+        if value.startswith(COMPRESSED):
+            return pickle.loads(zlib.decompress(value[1:]))
+        return pickle.loads(value[1:])
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.cache.add(key, self.encode(value), timeout, version)
+
+    def get(self, key, default=None, version=None):
+        value = self.cache.get(key, default, version)
+        if value is default:
+            metrics.count_cache(0, 1)
+            return default
+        metrics.count_cache(1, 0)
+        return self.decode(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.cache.set(key, self.encode(value), timeout, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.cache.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        return self.cache.delete(key, version)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = self.cache.get_many(keys, version)
+        metrics.count_cache(len(found), len(keys) - len(found))
+        return {key: self.decode(value) for key, value in found.items()}
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.cache.set_many(
+            {key: self.encode(value) for key, value in data.items()},
+            timeout,
+            version
+        )
+
+    def delete_many(self, keys, version=None):
+        self.cache.delete_many(keys, version)
+
+    def has_key(self, key, version=None):
+        return self.cache.has_key(key, version)
+
+    def incr(self, key, delta=1, version=None):
+        return self.cache.incr(key, delta, version)
+
+    def decr(self, key, delta=1, version=None):
+        return self.cache.decr(key, delta, version)
+
+    def clear(self):
+        self.cache.clear()
+        # Память процесса не должна пережить общий кэш.
+        tiered.clear()
+
+    def close(self, **kwargs):
+        self.cache.close(**kwargs)
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite из ``LOCATION``.
+
+    У каждого потока свое соединение. Лишние записи сверх
+    ``MAX_ENTRIES`` вытесняются в среднем раз в ``CULL_EVERY`` записей:
+    сначала просроченные, затем ``1 / CULL_FREQUENCY`` ближайших
+    к истечению.
+    """
+
+    def __init__(self, location, params):
+        options = dict(params.get('OPTIONS', {}))
+        self.cull_every = options.pop('CULL_EVERY', 100)
+        super().__init__({**params, 'OPTIONS': options})
+        self.path = location
+        self.local = threading.local()
+
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path, timeout=5, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, '
+                'value BLOB NOT NULL, expires REAL) WITHOUT ROWID'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)'
+            )
+            self.local.connection = connection
+        return connection
+
+    def execute(self, sql, params=()):
+        return self.connection().execute(sql, params)
+
+    def key(self, key, version):
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        return key
+
+    @staticmethod
+    def dump(value):
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(value):
+        return value if isinstance(value, int) else pickle.loads(value)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self.execute(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+            'expires = excluded.expires WHERE cache.expires <= ?',
+            (
+                self.key(key, version),
+                self.dump(value),
+                self.get_backend_timeout(timeout),
+                time.time(),
+            )
+        )
+        self.maybe_cull()
+        return cursor.rowcount == 1
+
+    def get(self, key, default=None, version=None):
+        row = self.execute(
+            'SELECT value FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.key(key, version), time.time())
+        ).fetchone()
+        return default if row is None else self.load(row[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (
+                self.get_backend_timeout(timeout),
+                self.key(key, version),
+                time.time(),
+            )
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key, version=None):
+        cursor = self.execute(
+            'DELETE FROM cache WHERE key = ?', (self.key(key, version),)
+        )
+        return cursor.rowcount == 1
+
+    def get_many(self, keys, version=None):
+        names = {self.key(key, version): key for key in keys}
+        if not names:
+            return {}
+        rows = self.execute(
+            'SELECT key, value FROM cache WHERE key IN ({}) '
+            'AND (expires IS NULL OR expires > ?)'.format(
+                ', '.join('?' * len(names))
+            ),
+            (*names, time.time())
+        )
+        return {names[name]: self.load(value) for name, value in rows}
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        self.connection().executemany(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            [
+                (self.key(key, version), self.dump(value), expires)
+                for key, value in data.items()
+            ]
+        )
+        self.maybe_cull()
+        return []
+
+    def delete_many(self, keys, version=None):
+        self.connection().executemany(
+            'DELETE FROM cache WHERE key = ?',
+            [(self.key(key, version),) for key in keys]
+        )
+
+    def has_key(self, key, version=None):
+        return self.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.key(key, version), time.time())
+        ).fetchone() is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self.key(key, version)
+        connection = self.connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute(
+                'UPDATE cache SET value = value + ? WHERE key = ? '
+                "AND typeof(value) = 'integer' "
+                'AND (expires IS NULL OR expires > ?)',
+                (delta, key, time.time())
+            )
+            row = connection.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, time.time())
+            ).fetchone()
+        finally:
+            connection.execute('COMMIT')
+        if row is None:
+            raise ValueError(f"Key '{key}' not found")
+        if not isinstance(row[0], int):
+            raise TypeError(f"Key '{key}' is not an integer")
+        return row[0]
+
+    def clear(self):
+        self.execute('DELETE FROM cache')
+
+    def maybe_cull(self):
+        if random.randrange(self.cull_every):
+            return
+        self.execute(
+            'DELETE FROM cache WHERE expires <= ?', (time.time(),)
+        )
+        count = self.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            self.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency,)
+            )
+
+    def stored_bytes(self):
+        """Объем значений в кэше, для замеров."""
+        return self.execute(
+            'SELECT COALESCE(SUM(length(value)), 0) FROM cache'
+        ).fetchone()[0]
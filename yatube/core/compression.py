@@ -0,0 +1,117 @@
+"""Сжатие ответов gzip и Brotli с кэшем сжатых вариантов.
+
+Кодировка выбирается по ``Accept-Encoding`` с учетом весов ``q``; при
+равных весах побеждает та, что раньше в
+``settings.COMPRESSION_ENCODINGS``. Brotli доступен, если установлен
+пакет ``brotli``.
+
+Тело ответа с ETag определяется самим ETag (см. ``core.http``): в нем
+версии кэша, параметры и пользователь. Поэтому сжатый вариант такого
+ответа кладется в кэш (``core.tiered``) под ключом из кодировки,
+длины тела и ETag, и страница из кэша сжимается один раз, а не на
+каждый запрос. Ответы с токеном CSRF в кэш не попадают: токен свой
+у каждой сессии.
+
+Сжатия и повторные использования считаются в ``core.metrics`` как
+``yatube_compression_total``.
+"""
+import gzip
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from . import metrics, tiered
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def available():
+    return [
+        encoding for encoding in settings.COMPRESSION_ENCODINGS
+        if encoding != 'br' or brotli is not None
+    ]
+
+
+def negotiate(accept_encoding):
+    """Лучшая доступная кодировка из ``Accept-Encoding`` или None."""
+    weights = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name] = weight
+    best, best_weight = None, 0.0
+    for encoding in available():
+        weight = weights.get(encoding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compress(data, encoding):
+    level = settings.COMPRESSION_LEVELS[encoding]
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    # Без времени в заголовке одинаковые тела сжимаются одинаково.
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def cache_key(request, response, encoding):
+    """Ключ сжатого варианта или None, если тело не определено ETag."""
+    etag = response.get('ETag')
+    if (
+        not etag
+        or response.status_code != 200
+        or request.META.get('CSRF_COOKIE_USED')
+    ):
+        return None
+    return f'compressed:{encoding}:{len(response.content)}:{etag}'
+
+
+def compressed(request, response, encoding):
+    key = cache_key(request, response, encoding)
+    if key is not None:
+        found = tiered.get_many([key])
+        if key in found:
+            metrics.count_event('compression', 'reused')
+            return found[key]
+    data = compress(response.content, encoding)
+    metrics.count_event('compression', 'compressed')
+    if key is not None:
+        tiered.set_many({key: data}, settings.COMPRESSION_CACHE_TIMEOUT)
+    return data
+
+
+def process(request, response):
+    if (
+        response.streaming
+        or response.has_header('Content-Encoding')
+        or len(response.content) < settings.COMPRESSION_MIN_LENGTH
+    ):
+        return response
+    patch_vary_headers(response, ('Accept-Encoding',))
+    encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    if encoding is None:
+        return response
+    data = compressed(request, response, encoding)
+    if len(data) >= len(response.content):
+        return response
+    response.content = data
+    response['Content-Length'] = str(len(data))
+    response['Content-Encoding'] = encoding
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        # Сжатое тело не совпадает побайтно с исходным.
+        response['ETag'] = 'W/' + etag
+    return response
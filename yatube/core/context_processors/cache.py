@@ -0,0 +1,7 @@
+from django.conf import settings
+
+
+def cache_timeout(request):
+    return {
+        'cache_timeout': settings.CACHE,
+    }
@@ -0,0 +1,33 @@
+"""Обслуживание соединений с базой данных.
+
+К каждому новому соединению с SQLite применяются ``settings.SQLITE_PRAGMAS``.
+Постоянные соединения (``CONN_MAX_AGE``) с ``CONN_HEALTH_CHECKS``
+в начале запроса проверяются и закрываются, если сервер их разорвал:
+Django откроет новое соединение при первом запросе к базе.
+"""
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(request_started)
+def check_connections(**kwargs):
+    for connection in connections.all():
+        if (
+            connection.settings_dict.get('CONN_HEALTH_CHECKS')
+            and connection.connection is not None
+            and not connection.in_atomic_block
+            and not connection.is_usable()
+        ):
+            connection.close()
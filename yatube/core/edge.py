@@ -0,0 +1,127 @@
+"""Кэширование анонимных страниц на обратном прокси.
+
+Анонимный запрос без cookie сессии идет по быстрому пути: пользователь
+подменяется на ``AnonymousUser`` до вызова представления, сессия
+не читается, и ответ не получает ни cookie, ни ``Vary: Cookie``. Такой
+ответ представления, помеченного ``cacheable``, получает
+``Cache-Control: public`` с ``s-maxage`` и заголовок ``Surrogate-Key``
+с ключами показанных данных: ``post-<id>``, ``author-<id>``,
+``group-<id>``, ``index``.
+
+Сигналы моделей вызывают ``purge`` с ключами измененных данных, и после
+фиксации транзакции прокси получает запрос ``PURGE`` на
+``settings.EDGE_PURGE_URL`` с теми же ключами в ``Surrogate-Key``.
+Остальные ответы помеченных представлений получают
+``Cache-Control: private``.
+"""
+import functools
+import logging
+import urllib.request
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
+from django.utils.cache import patch_cache_control
+
+from . import metrics, routers
+
+logger = logging.getLogger('core.edge')
+
+
+def anonymous(request):
+    """Запрос можно обслужить без сессии."""
+    return (
+        request.method in ('GET', 'HEAD')
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+    )
+
+
+def cacheable(view):
+    """Помечает ответы представления как пригодные для прокси."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        response.surrogate_keys = getattr(response, 'surrogate_keys', set())
+        return response
+    return wrapper
+
+
+def tag(response, *keys):
+    """Добавляет ключи данных, показанных на странице."""
+    response.surrogate_keys = {
+        *getattr(response, 'surrogate_keys', ()), *keys
+    }
+    return response
+
+
+def post_keys(posts):
+    """Ключи поста, его автора и группы для каждого поста."""
+    keys = set()
+    for post in posts:
+        keys.update((f'post-{post.pk}', f'author-{post.author_id}'))
+        if post.group_id is not None:
+            keys.add(f'group-{post.group_id}')
+    return keys
+
+
+def shared(response):
+    """Ответ одинаков для всех анонимных посетителей."""
+    return (
+        response.status_code in (200, 304)
+        and not response.cookies
+        and 'Cookie' not in response.get('Vary', '')
+    )
+
+
+def finish(request, response):
+    keys = getattr(response, 'surrogate_keys', None)
+    if keys is None:
+        return response
+    if not (getattr(request, 'edge', False) and shared(response)):
+        patch_cache_control(response, private=True)
+        return response
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=settings.EDGE_BROWSER_CACHE_TIMEOUT,
+        s_maxage=settings.EDGE_CACHE_TIMEOUT,
+    )
+    if keys:
+        response['Surrogate-Key'] = ' '.join(sorted(keys))
+    return response
+
+
+def purge(*keys):
+    """Сбрасывает страницы с ключами после фиксации транзакции.
+
+    Прокси заполнит их заново запросами, читающими из основной базы
+    (``routers.invalidate``).
+    """
+    if settings.EDGE_PURGE_URL and keys:
+        routers.invalidate()
+        transaction.on_commit(lambda: send(keys))
+
+
+def send(keys):
+    request = urllib.request.Request(
+        settings.EDGE_PURGE_URL,
+        method='PURGE',
+        headers={'Surrogate-Key': ' '.join(sorted(set(keys)))},
+    )
+    try:
+        with urllib.request.urlopen(
+            request, timeout=settings.EDGE_PURGE_TIMEOUT
+        ):
+            pass
+    except OSError as error:
+        metrics.count_event('edge_purge', 'failed')
+        logger.warning('PURGE %s failed: %s', ' '.join(keys), error)
+        return
+    metrics.count_event('edge_purge', 'sent')
+
+
+def fast_path(request):
+    """Подменяет пользователя до того, как кто-то прочтет сессию."""
+    request.edge = anonymous(request)
+    if request.edge:
+        request.user = AnonymousUser()
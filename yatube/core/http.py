@@ -0,0 +1,41 @@
+"""Условные GET-запросы: ETag и Last-Modified без рендера страницы.
+
+Валидатор собирается из того же, из чего строится страница: версий
+областей кэша (``core.cache``), параметров запроса и пользователя.
+Пока они не изменились, повторный запрос получает 304 до выборки ленты
+и рендера шаблона.
+
+Версии одинаковы у всех воркеров только в общем кэше, поэтому без него
+(``settings.CACHE_SHARED``) валидаторы не отдаются и 304 не бывает.
+"""
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def etag(*parts):
+    """Слабый ETag из частей, от которых зависит страница."""
+    data = '\x1f'.join(str(part) for part in parts).encode()
+    return 'W/' + quote_etag(hashlib.md5(data).hexdigest())
+
+
+def not_modified(request, etag, last_modified=None):
+    """Ответ 304 или 412, если у клиента актуальная версия, иначе None."""
+    if not settings.CACHE_SHARED or request.method not in ('GET', 'HEAD'):
+        return None
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=last_modified and int(last_modified.timestamp()),
+    )
+
+
+def set_validators(response, etag, last_modified=None):
+    if not settings.CACHE_SHARED or response.status_code != 200:
+        return response
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
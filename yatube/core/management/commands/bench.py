@@ -0,0 +1,79 @@
+import json
+import platform
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from core.benchmark import (
+    cache_hit_latency, compression_cost, database_throughput, view_latency
+)
+from posts.models import Comment, Follow, Post, User
+
+SUITES = ('views', 'cache', 'compression', 'db')
+OPTIONS = ('repeat', 'cold', 'readers', 'writers', 'seconds')
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочные замеры: views — p50/p95 задержки, число запросов '
+        'и размер главных страниц; cache — ответы из кэша на разных '
+        'бэкендах; compression — экономия и цена сжатия; db — чтение '
+        'и запись в несколько потоков (пишет в базу, запускать на копии). '
+        'Результат — JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'suites', nargs='*',
+            help=f'Замеры из {", ".join(SUITES)}, по умолчанию views.'
+        )
+        parser.add_argument(
+            '--repeat', type=int,
+            help='Повторов запроса, по умолчанию свое у каждого замера.'
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='views: очищать кэш перед каждым запросом.'
+        )
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument('--output', help='Файл для результата.')
+
+    def handle(self, *args, **options):
+        suites = dict.fromkeys(options['suites'] or ['views'])
+        unknown = set(suites) - set(SUITES)
+        if unknown:
+            raise CommandError(f'Неизвестные замеры: {", ".join(unknown)}')
+        repeat = {}
+        if options['repeat'] is not None:
+            repeat['repeat'] = options['repeat']
+        result = {
+            'started': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'rows': {
+                model._meta.model_name: model.objects.count()
+                for model in (User, Post, Comment, Follow)
+            },
+            'options': {name: options[name] for name in OPTIONS},
+        }
+        for suite in suites:
+            if suite == 'views':
+                result[suite] = view_latency(cold=options['cold'], **repeat)
+            elif suite == 'cache':
+                result[suite] = cache_hit_latency(**repeat)
+            elif suite == 'compression':
+                result[suite] = compression_cost(**repeat)
+            else:
+                result[suite] = database_throughput(
+                    options['readers'], options['writers'],
+                    options['seconds']
+                )
+        data = json.dumps(result, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(data)
+        else:
+            self.stdout.write(data)
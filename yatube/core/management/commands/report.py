@@ -0,0 +1,52 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.sampler import read, report
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводка журнала медленных запросов: SQL-запросы по отпечаткам '
+        'и страницы по именам адресов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'files', nargs='*',
+            help='Файлы журнала, по умолчанию settings.SLOW_LOG_FILE.'
+        )
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument(
+            '--order', choices=('total', 'max', 'p95', 'count'),
+            default='total'
+        )
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        records = []
+        for name in options['files'] or [settings.SLOW_LOG_FILE]:
+            try:
+                with open(name, encoding='utf-8') as lines:
+                    records += read(lines)
+            except OSError as error:
+                raise CommandError(error)
+        result = report(records, options['limit'], options['order'])
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2, ensure_ascii=False))
+            return
+        self.stdout.write('SQL-запросы:')
+        for row in result['query']:
+            self.stdout.write(
+                f'{row["total"]:10.3f} с {row["count"]:6} раз '
+                f'макс {row["max"]:.3f} с  [{row["id"]}] {row["name"]}'
+            )
+            for place, count in row['origins'].items():
+                self.stdout.write(f'{"":30}{count:6} × {place}')
+        self.stdout.write('Страницы:')
+        for row in result['request']:
+            self.stdout.write(
+                f'{row["total"]:10.3f} с {row["count"]:6} раз '
+                f'макс {row["max"]:.3f} с  {row["name"]}'
+            )
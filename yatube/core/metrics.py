@@ -0,0 +1,197 @@
+"""Метрики запросов без панели отладки.
+
+``core.middleware.MetricsMiddleware`` замеряет для каждого запроса
+полное время, число и время SQL-запросов, попадания и промахи кэша
+и время рендера шаблонов. Замеры уходят клиенту в заголовке ``Server-Timing``
+и копятся в гистограммах по имени адреса (``posts:index``, ...),
+которые ``core.views.metrics`` отдает в текстовом формате Prometheus.
+
+Счетчики живут в памяти процесса, поэтому при нескольких воркерах
+Prometheus должен опрашивать каждый из них.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+_local = threading.local()
+_lock = threading.Lock()
+
+
+class RequestMetrics:
+    __slots__ = (
+        'queries', 'query_time', 'cache_hits', 'cache_misses',
+        'template_time',
+    )
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0.0
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.buckets = [0] * len(settings.METRICS_BUCKETS)
+        self.count = 0
+        self.duration = 0.0
+        self.queries = 0
+        self.query_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0.0
+
+    def add(self, duration, metrics):
+        for number, bound in enumerate(settings.METRICS_BUCKETS):
+            if duration <= bound:
+                self.buckets[number] += 1
+        self.count += 1
+        self.duration += duration
+        self.queries += metrics.queries
+        self.query_time += metrics.query_time
+        self.cache_hits += metrics.cache_hits
+        self.cache_misses += metrics.cache_misses
+        self.template_time += metrics.template_time
+
+
+_views = defaultdict(ViewMetrics)
+# Счетчики событий вне запросов: имя -> {значение метки: число}.
+_events = defaultdict(lambda: defaultdict(int))
+
+
+def start():
+    _local.metrics = RequestMetrics()
+    return _local.metrics
+
+
+def stop():
+    _local.metrics = None
+
+
+def current():
+    """Метрики текущего запроса или None вне запроса."""
+    return getattr(_local, 'metrics', None)
+
+
+def count_cache(hits, misses):
+    metrics = current()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+def count_template(duration):
+    metrics = current()
+    if metrics is not None:
+        metrics.template_time += duration
+
+
+def count_event(name, label, value=1):
+    """Увеличивает счетчик ``yatube_<name>_total{result="<label>"}``."""
+    with _lock:
+        _events[name][label] += value
+
+
+def events(name):
+    with _lock:
+        return dict(_events.get(name, {}))
+
+
+def time_query(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics = current()
+        if metrics is not None:
+            metrics.queries += 1
+            metrics.query_time += time.perf_counter() - start
+
+
+def server_timing(duration, metrics):
+    return ', '.join((
+        f'total;dur={duration * 1000:.1f}',
+        f'db;dur={metrics.query_time * 1000:.1f};'
+        f'desc="{metrics.queries} queries"',
+        f'cache;desc="{metrics.cache_hits} hits {metrics.cache_misses} '
+        'misses"',
+        f'tpl;dur={metrics.template_time * 1000:.1f}',
+    ))
+
+
+def reset():
+    with _lock:
+        _views.clear()
+        _events.clear()
+
+
+def observe(name, duration, metrics):
+    with _lock:
+        _views[name].add(duration, metrics)
+
+
+def snapshot():
+    with _lock:
+        return {
+            name: (list(view.buckets), vars(view).copy())
+            for name, view in _views.items()
+        }
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def render():
+    """Метрики в текстовом формате Prometheus."""
+    lines = [
+        '# HELP yatube_request_duration_seconds Время ответа.',
+        '# TYPE yatube_request_duration_seconds histogram',
+    ]
+    views = snapshot()
+    with _lock:
+        counted = {name: dict(labels) for name, labels in _events.items()}
+    for name, (buckets, totals) in sorted(views.items()):
+        label = f'view="{escape(name)}"'
+        for bound, count in zip(settings.METRICS_BUCKETS, buckets):
+            lines.append(
+                f'yatube_request_duration_seconds_bucket{{{label},'
+                f'le="{bound}"}} {count}'
+            )
+        lines += [
+            f'yatube_request_duration_seconds_bucket{{{label},le="+Inf"}} '
+            f'{totals["count"]}',
+            f'yatube_request_duration_seconds_sum{{{label}}} '
+            f'{totals["duration"]}',
+            f'yatube_request_duration_seconds_count{{{label}}} '
+            f'{totals["count"]}',
+        ]
+    counters = (
+        ('db_queries_total', 'queries', 'SQL-запросов.'),
+        ('db_duration_seconds_total', 'query_time', 'Время SQL-запросов.'),
+        ('cache_hits_total', 'cache_hits', 'Попаданий в кэш.'),
+        ('cache_misses_total', 'cache_misses', 'Промахов кэша.'),
+        (
+            'template_duration_seconds_total', 'template_time',
+            'Время рендера шаблонов.'
+        ),
+    )
+    for metric, field, description in counters:
+        lines += [
+            f'# HELP yatube_{metric} {description}',
+            f'# TYPE yatube_{metric} counter',
+        ]
+        lines += [
+            f'yatube_{metric}{{view="{escape(name)}"}} {totals[field]}'
+            for name, (_, totals) in sorted(views.items())
+        ]
+    for name, labels in sorted(counted.items()):
+        lines.append(f'# TYPE yatube_{name}_total counter')
+        lines += [
+            f'yatube_{name}_total{{result="{escape(label)}"}} {value}'
+            for label, value in sorted(labels.items())
+        ]
+    return '\n'.join(lines) + '\n'
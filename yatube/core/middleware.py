@@ -0,0 +1,119 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import compression, edge, metrics, routers, sampler
+
+
+class ReplicaPinMiddleware:
+    """Закрепляет пользователя за основной базой после записи,
+    а все запросы — после сброса кэша (``routers.invalidate``).
+
+    Метка живет в cookie, а не в сессии: чтение сессии само идет
+    через маршрутизатор баз.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        name = settings.REPLICA_PIN_COOKIE
+        try:
+            until = float(request.COOKIES.get(name, 0))
+        except ValueError:
+            until = 0
+        routers.reset(pinned=until > time.time() or routers.invalidated())
+        try:
+            response = self.get_response(request)
+            if routers.wrote() and settings.DATABASE_REPLICAS:
+                seconds = settings.REPLICA_PIN_SECONDS
+                response.set_cookie(
+                    name, str(time.time() + seconds), max_age=seconds
+                )
+            return response
+        finally:
+            routers.reset()
+
+
+class CompressionMiddleware:
+    """Сжимает ответы gzip или Brotli, см. ``core.compression``."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return compression.process(request, self.get_response(request))
+
+
+class EdgeCacheMiddleware:
+    """Быстрый путь анонимных запросов и заголовки для прокси,
+    см. ``core.edge``.
+
+    Стоит перед ``SessionMiddleware``: заголовки ставятся, когда
+    cookie ответа уже известны, а пользователь подменяется
+    в ``process_view``, после ``AuthenticationMiddleware``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return edge.finish(request, self.get_response(request))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        edge.fast_path(request)
+
+
+class MetricsMiddleware:
+    """Замеряет запрос целиком: стоит первым в ``MIDDLEWARE``."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        collected = metrics.start()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(metrics.time_query)
+                    )
+                response = self.get_response(request)
+        finally:
+            metrics.stop()
+        duration = time.perf_counter() - start
+        response['Server-Timing'] = metrics.server_timing(duration, collected)
+        match = request.resolver_match
+        metrics.observe(
+            match.view_name if match else 'unmatched', duration, collected
+        )
+        return response
+
+
+class SlowRequestMiddleware:
+    """Пишет в журнал медленные SQL- и HTTP-запросы и выборочно
+    профилирует запросы, см. ``core.sampler``."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sampler.start(request)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(sampler.log_slow_query)
+                    )
+                sample = stack.enter_context(sampler.Sample())
+                response = self.get_response(request)
+            sampler.log_request(
+                request, response, time.perf_counter() - start, sample
+            )
+            return response
+        finally:
+            sampler.stop()
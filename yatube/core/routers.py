@@ -0,0 +1,70 @@
+"""Чтение с реплик с гарантией «читаю свои записи».
+
+Запросы на чтение уходят на случайную базу из
+``settings.DATABASE_REPLICAS``, записи — в основную. Запрос закрепляется
+за основной базой, если в нём уже была запись, если идёт транзакция
+или если пользователь писал в базу меньше
+``settings.REPLICA_PIN_SECONDS`` назад (см. ``core.middleware``).
+
+После сброса кэша (``core.cache.bump``, ``core.edge.purge``) так же
+закрепляются все запросы: иначе первый пересчет мог бы прочесть
+отстающую реплику и сохранить старые данные под новой версией или
+на прокси. Метка ``invalidate`` живет в общем кэше столько же секунд.
+"""
+import random
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+INVALIDATED_KEY = 'replica:invalidated'
+
+_state = threading.local()
+
+
+def reset(pinned=False):
+    _state.pinned = pinned
+    _state.wrote = False
+
+
+def pinned():
+    return getattr(_state, 'pinned', False) or wrote()
+
+
+def wrote():
+    return getattr(_state, 'wrote', False)
+
+
+def invalidate():
+    """Отмечает изменение данных после фиксации транзакции."""
+    if settings.DATABASE_REPLICAS:
+        transaction.on_commit(lambda: cache.set(
+            INVALIDATED_KEY, True, settings.REPLICA_PIN_SECONDS
+        ))
+
+
+def invalidated():
+    """Реплики могут еще не знать о последнем изменении данных."""
+    return bool(settings.DATABASE_REPLICAS and cache.get(INVALIDATED_KEY))
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (
+            not settings.DATABASE_REPLICAS
+            or pinned()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,251 @@
+"""Журнал медленных запросов и выборочное профилирование.
+
+``core.middleware.SlowRequestMiddleware`` пишет в логгер ``core.slow``
+по строке JSON на каждый SQL-запрос дольше
+``settings.SLOW_QUERY_SECONDS`` и на каждый HTTP-запрос дольше
+``settings.SLOW_REQUEST_SECONDS``. Доля ``settings.PROFILE_SAMPLE_RATE``
+запросов выполняется под cProfile, доля
+``settings.TRACEMALLOC_SAMPLE_RATE`` — под tracemalloc, их сводка
+попадает в ту же строку. Команда ``report`` собирает журнал в список
+главных виновников.
+
+Запись о SQL-запросе содержит отпечаток — текст без значений
+параметров, по которому одинаковые запросы складываются вместе, —
+и место в коде проекта, откуда запрос пришел. Число строк известно
+для изменений и для бэкендов, которые выбирают результат при
+выполнении (PostgreSQL); SQLite сообщает его только для изменений.
+"""
+import cProfile
+import hashlib
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import traceback
+import tracemalloc
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+logger = logging.getLogger('core.slow')
+
+_local = threading.local()
+# Одновременно работает только один профилировщик cProfile и только
+# одна выборка tracemalloc: трассировка общая для процесса, и второй
+# запрос остановил бы ее посреди первого.
+_profiling = threading.Lock()
+_tracing = threading.Lock()
+
+STRINGS = re.compile(r"'(?:[^']|'')*'")
+NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDERS = re.compile(r'%s|\?')
+LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+SPACES = re.compile(r'\s+')
+# Кадры библиотек и самого журнала не считаются местом вызова запроса.
+SITE_PACKAGES = os.sep + 'site-packages' + os.sep
+HERE = os.path.dirname(__file__)
+
+
+def fingerprint(sql):
+    """Текст запроса без значений: ``IN (%s, %s)`` и ``IN (1, 2)``
+    дают один отпечаток."""
+    sql = STRINGS.sub('?', sql)
+    sql = NUMBERS.sub('?', sql)
+    sql = PLACEHOLDERS.sub('?', sql)
+    sql = LISTS.sub('(...)', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+def digest(text):
+    return hashlib.md5(text.encode()).hexdigest()[:12]
+
+
+def origin():
+    """Ближайший к запросу кадр из кода проекта: ``posts/views.py:42``."""
+    for frame in reversed(traceback.extract_stack()):
+        filename = frame.filename
+        if (
+            filename.startswith(str(settings.BASE_DIR))
+            and not filename.startswith(HERE)
+            and SITE_PACKAGES not in filename
+        ):
+            path = os.path.relpath(filename, settings.BASE_DIR)
+            return f'{path}:{frame.lineno} in {frame.name}'
+    return None
+
+
+def view_name():
+    request = getattr(_local, 'request', None)
+    match = request and request.resolver_match
+    return match.view_name if match else None
+
+
+def log(event, **fields):
+    logger.info(json.dumps(
+        {'event': event, 'time': time.time(), **fields},
+        ensure_ascii=False, default=str
+    ))
+
+
+def log_slow_query(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        if duration >= settings.SLOW_QUERY_SECONDS:
+            rows = context['cursor'].rowcount
+            text = fingerprint(sql)
+            log(
+                'query',
+                fingerprint=text,
+                id=digest(text),
+                view=view_name(),
+                origin=origin(),
+                duration=round(duration, 6),
+                rows=rows if rows >= 0 else None,
+                many=many,
+            )
+
+
+class Sample:
+    """Профилировщики одного запроса, выбранные случайно."""
+
+    def __init__(self):
+        self.profile = None
+        self.tracing = False
+        if (
+            random.random() < settings.PROFILE_SAMPLE_RATE
+            and _profiling.acquire(blocking=False)
+        ):
+            self.profile = cProfile.Profile()
+        if (
+            random.random() < settings.TRACEMALLOC_SAMPLE_RATE
+            and _tracing.acquire(blocking=False)
+        ):
+            # Трассировку, запущенную не нами (PYTHONTRACEMALLOC),
+            # не останавливаем.
+            if tracemalloc.is_tracing():
+                _tracing.release()
+            else:
+                self.tracing = True
+
+    def __enter__(self):
+        if self.tracing:
+            tracemalloc.start()
+        if self.profile:
+            self.profile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.profile:
+            self.profile.disable()
+            _profiling.release()
+        if self.tracing:
+            try:
+                self.snapshot = tracemalloc.take_snapshot()
+                self.peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+                _tracing.release()
+
+    def summary(self, limit=10):
+        fields = {}
+        if self.profile:
+            output = io.StringIO()
+            stats = pstats.Stats(self.profile, stream=output)
+            stats.sort_stats('cumulative').print_stats(limit)
+            fields['profile'] = output.getvalue()
+        if self.tracing:
+            fields['memory_peak'] = self.peak
+            fields['allocations'] = [
+                str(statistic)
+                for statistic in self.snapshot.statistics('lineno')[:limit]
+            ]
+        return fields
+
+    @property
+    def active(self):
+        return bool(self.profile or self.tracing)
+
+
+def start(request):
+    _local.request = request
+
+
+def stop():
+    _local.request = None
+
+
+def log_request(request, response, duration, sample):
+    if duration < settings.SLOW_REQUEST_SECONDS and not sample.active:
+        return
+    log(
+        'request',
+        view=view_name() or 'unmatched',
+        method=request.method,
+        path=request.path,
+        status=response.status_code,
+        duration=round(duration, 6),
+        sampled=sample.active,
+        **sample.summary(),
+    )
+
+
+def read(lines):
+    """Записи журнала из строк; чужие строки пропускаются."""
+    for line in lines:
+        brace = line.find('{')
+        if brace < 0:
+            continue
+        try:
+            record = json.loads(line[brace:])
+        except ValueError:
+            continue
+        if isinstance(record, dict) and 'event' in record:
+            yield record
+
+
+def report(records, limit=10, order='total'):
+    """Главные виновники: SQL-запросы по отпечаткам и страницы
+    по именам адресов, упорядоченные по суммарному, максимальному
+    времени или числу записей."""
+    groups = {
+        'query': defaultdict(list),
+        'request': defaultdict(list),
+    }
+    for record in records:
+        if record['event'] == 'query':
+            groups['query'][record['fingerprint']].append(record)
+        elif record['event'] == 'request':
+            groups['request'][record['view']].append(record)
+    result = {}
+    for event, grouped in groups.items():
+        rows = []
+        for name, items in grouped.items():
+            durations = sorted(item['duration'] for item in items)
+            row = {
+                'name': name,
+                'count': len(items),
+                'total': round(sum(durations), 6),
+                'max': durations[-1],
+                'p95': durations[int(0.95 * (len(durations) - 1))],
+            }
+            if event == 'query':
+                row['id'] = items[0]['id']
+                row['views'] = dict(Counter(item['view'] for item in items))
+                row['origins'] = dict(
+                    Counter(item['origin'] for item in items).most_common(3)
+                )
+                known = [item['rows'] for item in items
+                         if item.get('rows') is not None]
+                row['rows'] = max(known) if known else None
+            rows.append(row)
+        rows.sort(key=lambda row: row[order], reverse=True)
+        result[event] = rows[:limit]
+    return result
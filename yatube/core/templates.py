@@ -0,0 +1,45 @@
+"""Шаблонизатор Django с замером времени рендера для ``core.metrics``."""
+import threading
+import time
+
+from django.template.backends.django import DjangoTemplates, Template
+
+from . import metrics
+
+_local = threading.local()
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        # render_to_string внутри шаблона (карточки, теги) уже входит
+        # во время внешнего рендера: замеряется только он.
+        depth = getattr(_local, 'depth', 0)
+        if depth:
+            _local.depth = depth + 1
+            try:
+                return super().render(context, request)
+            finally:
+                _local.depth = depth
+        _local.depth = 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            _local.depth = 0
+            metrics.count_template(time.perf_counter() - start)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Замеряет шаблоны, отрисованные через бэкенд: ``render``,
+    ``TemplateResponse``, ``render_to_string``. Вложенные ``include``
+    и ``render_to_string`` входят во время внешнего шаблона.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(
+            self.engine.from_string(template_code), self
+        )
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
@@ -1,4 +1,5 @@
 from django import template
+from django.http import QueryDict
 
 register = template.Library()
 
@@ -6,3 +7,24 @@ register = template.Library()
 @register.filter
 def addclass(field, css):
     return field.as_widget(attrs={'class': css})
+
+
+# Ссылки навигации попадают в закэшированные страницы, поэтому
+# переносятся только параметры, которые понимают сами страницы.
+QUERY_PARAMETERS = ('page', 'cursor', 'date', 'q')
+
+
+@register.simple_tag(takes_context=True)
+def query_replace(context, **kwargs):
+    """Строка запроса страницы с замененными (или удаленными)
+    параметрами; посторонние параметры отбрасываются."""
+    query = QueryDict(mutable=True)
+    for key in QUERY_PARAMETERS:
+        if key in context['request'].GET:
+            query[key] = context['request'].GET[key]
+    for key, value in kwargs.items():
+        if value is None:
+            query.pop(key, None)
+        else:
+            query[key] = value
+    return query.urlencode()
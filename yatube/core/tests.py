@@ -0,0 +1,656 @@
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.http import HttpResponse
+from django.template import engines
+from django.template.loader import render_to_string
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, override_settings
+)
+from django.urls import reverse
+
+from yatube.caches import cache, shared
+from yatube.database import database, replica
+
+from . import cache as core_cache
+from . import compression, db, metrics, routers, sampler, tiered
+from .cache_backends import COMPRESSED, CompressedCache, SQLiteCache
+from .middleware import ReplicaPinMiddleware
+
+
+class DatabaseConfigTests(SimpleTestCase):
+    def test_sqlite_by_default(self):
+        """Без переменных окружения используется файл SQLite."""
+        config = database('/base', environ={})
+        self.assertEqual(config['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(config['NAME'], '/base/db.sqlite3')
+        self.assertGreater(config['CONN_MAX_AGE'], 0)
+        self.assertTrue(config['CONN_HEALTH_CHECKS'])
+
+    def test_postgresql(self):
+        """PostgreSQL настраивается переменными окружения."""
+        config = database('/base', environ={
+            'DB_ENGINE': 'postgresql',
+            'DB_NAME': 'name',
+            'DB_HOST': 'db',
+            'DB_CONN_MAX_AGE': '300',
+        })
+        self.assertEqual(config['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(config['NAME'], 'name')
+        self.assertEqual(config['HOST'], 'db')
+        self.assertEqual(config['CONN_MAX_AGE'], 300)
+
+    def test_replica(self):
+        """Реплика подключается переменными DB_REPLICA_*, остальное
+        берется у основной базы."""
+        self.assertIsNone(replica('/base', environ={}))
+        config = replica('/base', environ={
+            'DB_ENGINE': 'postgresql',
+            'DB_USER': 'user',
+            'DB_REPLICA_HOST': 'replica',
+        })
+        self.assertEqual(config['HOST'], 'replica')
+        self.assertEqual(config['USER'], 'user')
+        self.assertEqual(config['TEST'], {'MIRROR': 'default'})
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            database('/base', environ={'DB_ENGINE': 'oracle'})
+
+    def test_unusable_connections_are_closed(self):
+        """Разорванное постоянное соединение закрывается в начале
+        запроса, рабочее остается открытым."""
+        broken, alive = mock.Mock(), mock.Mock()
+        for wrapper, usable in ((broken, False), (alive, True)):
+            wrapper.settings_dict = {'CONN_HEALTH_CHECKS': True}
+            wrapper.in_atomic_block = False
+            wrapper.is_usable.return_value = usable
+        with mock.patch.object(db.connections, 'all') as all_connections:
+            all_connections.return_value = [broken, alive]
+            db.check_connections()
+        broken.close.assert_called_once()
+        alive.close.assert_not_called()
+
+
+class SQLitePragmaTests(TestCase):
+    def test_pragmas_are_applied(self):
+        """Соединение с SQLite открывается с настроенными прагмами."""
+        if connection.vendor != 'sqlite':
+            self.skipTest('Только для SQLite')
+        expected = {
+            'busy_timeout': settings.SQLITE_PRAGMAS['busy_timeout'],
+            'cache_size': settings.SQLITE_PRAGMAS['cache_size'],
+            # NORMAL
+            'synchronous': 1,
+        }
+        with connection.cursor() as cursor:
+            for name, value in expected.items():
+                with self.subTest(pragma=name):
+                    cursor.execute(f'PRAGMA {name}')
+                    self.assertEqual(cursor.fetchone()[0], value)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+        routers.reset()
+        self.addCleanup(routers.reset)
+        default_cache.delete(routers.INVALIDATED_KEY)
+        self.addCleanup(default_cache.delete, routers.INVALIDATED_KEY)
+
+    def test_reads_go_to_replica_until_write(self):
+        """Чтение идет на реплику, а после записи — в основную базу."""
+        self.assertEqual(self.router.db_for_read(None), 'replica')
+        self.assertEqual(self.router.db_for_write(None), 'default')
+        self.assertEqual(self.router.db_for_read(None), 'default')
+
+    def test_pinned_request_reads_primary(self):
+        routers.reset(pinned=True)
+        self.assertEqual(self.router.db_for_read(None), 'default')
+
+    def test_no_migrations_on_replica(self):
+        self.assertFalse(self.router.allow_migrate('replica', 'posts'))
+        self.assertTrue(self.router.allow_migrate('default', 'posts'))
+
+    def test_middleware_pins_by_cookie(self):
+        """Запрос с непросроченной cookie читает из основной базы."""
+        seen = []
+
+        def view(request):
+            seen.append(routers.pinned())
+            return HttpResponse()
+
+        middleware = ReplicaPinMiddleware(view)
+        factory = RequestFactory()
+        cookies = {
+            '': False,
+            'garbage': False,
+            str(time.time() - 1): False,
+            str(time.time() + 60): True,
+        }
+        for value, expected in cookies.items():
+            with self.subTest(cookie=value):
+                request = factory.get('/')
+                request.COOKIES[settings.REPLICA_PIN_COOKIE] = value
+                middleware(request)
+                self.assertEqual(seen.pop(), expected)
+                self.assertFalse(routers.pinned())
+
+    def test_invalidation_pins_all_requests(self):
+        """После сброса кэша любой запрос читает из основной базы, пока
+        реплики могут отставать."""
+        seen = []
+
+        def view(request):
+            seen.append(routers.pinned())
+            return HttpResponse()
+
+        middleware = ReplicaPinMiddleware(view)
+        request = RequestFactory().get('/')
+        middleware(request)
+        with mock.patch.object(
+            routers.transaction, 'on_commit', side_effect=lambda func: func()
+        ):
+            core_cache.bump('scope')
+        middleware(request)
+        self.assertEqual(seen, [False, True])
+
+
+# Реплика указывает на основную базу, чтобы запросы выполнялись.
+@override_settings(DATABASE_REPLICAS=['default'])
+class ReplicaPinTests(TestCase):
+    def test_write_sets_pin_cookie(self):
+        """Подписка закрепляет пользователя за основной базой,
+        а простое чтение — нет."""
+        user = get_user_model().objects.create_user(username='user')
+        get_user_model().objects.create_user(username='author')
+        self.client.force_login(user)
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        response = self.client.get(
+            reverse('posts:profile_follow', args=['author'])
+        )
+        cookie = response.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_PIN_SECONDS)
+        self.assertGreater(float(cookie.value), time.time())
+
+
+class CacheBackendTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.sqlite3')
+
+    def sqlite_cache(self):
+        return CompressedCache(self.path, {
+            'OPTIONS': {'BACKEND': 'core.cache_backends.SQLiteCache'},
+        })
+
+    def test_config(self):
+        """По умолчанию кэш в памяти со сжатием, общий кэш выбирается
+        переменными окружения."""
+        config = cache('/base', environ={})
+        self.assertEqual(
+            config['OPTIONS']['BACKEND'],
+            'django.core.cache.backends.locmem.LocMemCache'
+        )
+        config = cache('/base', environ={'CACHE_BACKEND': 'sqlite'})
+        self.assertEqual(config['LOCATION'], '/base/cache.sqlite3')
+        with self.assertRaises(ValueError):
+            cache('/base', environ={'CACHE_BACKEND': 'unknown'})
+        self.assertFalse(shared(environ={}))
+        self.assertTrue(shared(environ={'CACHE_BACKEND': 'sqlite'}))
+
+    def test_values_are_compressed(self):
+        """Длинные значения сжимаются, короткие и числа — нет."""
+        backend = self.sqlite_cache()
+        text = 'повтор ' * 1000
+        backend.set('long', text)
+        backend.set('short', 'коротко')
+        stored = backend.cache.get('long')
+        self.assertTrue(stored.startswith(COMPRESSED))
+        self.assertLess(len(stored), len(text))
+        self.assertFalse(backend.cache.get('short').startswith(COMPRESSED))
+        self.assertEqual(backend.get_many(['long', 'short', 'missing']), {
+            'long': text, 'short': 'коротко'
+        })
+
+    def test_shared_between_instances(self):
+        """Записи и инкременты видны другим процессам через файл."""
+        first, second = self.sqlite_cache(), self.sqlite_cache()
+        first.set('version', 1)
+        self.assertEqual(second.incr('version'), 2)
+        self.assertEqual(first.get('version'), 2)
+        second.delete('version')
+        self.assertIsNone(first.get('version'))
+        with self.assertRaises(ValueError):
+            first.incr('version')
+
+    def test_add_and_expiry(self):
+        """add не перезаписывает живую запись, но занимает просроченную."""
+        backend = SQLiteCache(self.path, {})
+        self.assertTrue(backend.add('lock', 'first', 60))
+        self.assertFalse(backend.add('lock', 'second', 60))
+        self.assertEqual(backend.get('lock'), 'first')
+        backend.set('lock', 'expired', -1)
+        self.assertIsNone(backend.get('lock'))
+        self.assertFalse(backend.has_key('lock'))
+        self.assertTrue(backend.add('lock', 'third', 60))
+        self.assertEqual(backend.get('lock'), 'third')
+
+    def test_cull(self):
+        """Записи сверх MAX_ENTRIES вытесняются."""
+        backend = SQLiteCache(self.path, {
+            'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_EVERY': 1},
+        })
+        for number in range(20):
+            backend.set(f'key{number}', number)
+        count = backend.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        self.assertLessEqual(count, 11)
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsTests(TestCase):
+    def setUp(self):
+        default_cache.clear()
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_server_timing(self):
+        """Ответ несет замеры запроса в Server-Timing."""
+        response = self.client.get(reverse('posts:index'))
+        timing = response['Server-Timing']
+        for name in ('total;dur=', 'db;dur=', 'cache;desc=', 'tpl;dur='):
+            self.assertIn(name, timing)
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+
+    def test_histograms(self):
+        """Гистограммы копятся по имени адреса."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        self.client.get('/missing/')
+        text = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        ).content.decode()
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+            text
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket{view="posts:index",'
+            'le="+Inf"} 2',
+            text
+        )
+        self.assertIn('{view="unmatched"}', text)
+        self.assertRegex(
+            text, r'yatube_db_queries_total\{view="posts:index"\} [1-9]'
+        )
+        self.assertRegex(
+            text, r'yatube_template_duration_seconds_total'
+            r'\{view="posts:index"\} 0\.\d*[1-9]'
+        )
+
+    def test_cache_counters(self):
+        """Промахи и попадания кэша считаются в запросе."""
+        collected = metrics.start()
+        self.addCleanup(metrics.stop)
+        backend = CompressedCache('metrics', {
+            'OPTIONS': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+            },
+        })
+        backend.set('key', 'value')
+        backend.get('key')
+        backend.get('missing')
+        backend.get_many(['key', 'missing'])
+        self.assertEqual(
+            (collected.cache_hits, collected.cache_misses), (2, 2)
+        )
+
+    def test_nested_templates_counted_once(self):
+        """render_to_string внутри шаблона не входит в замер дважды."""
+        class Card:
+            def __str__(self):
+                return render_to_string('core/404.html', {'path': '/'})
+
+        with mock.patch.object(metrics, 'count_template') as count:
+            engines.all()[0].from_string('{{ card }}').render(
+                {'card': Card()}
+            )
+        self.assertEqual(count.call_count, 1)
+
+    def test_metrics_are_private(self):
+        """Метрики отдаются только с токеном из настроек."""
+        url = reverse('metrics')
+        for header in ('', 'Bearer wrong', 'secret'):
+            with self.subTest(header=header):
+                response = self.client.get(url, HTTP_AUTHORIZATION=header)
+                self.assertEqual(response.status_code, 404)
+        with override_settings(METRICS_TOKEN=''):
+            response = self.client.get(url, HTTP_AUTHORIZATION='Bearer ')
+            self.assertEqual(response.status_code, 404)
+
+
+@override_settings(SLOW_QUERY_SECONDS=0, SLOW_REQUEST_SECONDS=0)
+class SlowLogTests(TestCase):
+    def setUp(self):
+        default_cache.clear()
+
+    def records(self, url):
+        with self.assertLogs('core.slow') as logs:
+            self.client.get(url)
+        return list(sampler.read(logs.output))
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            sampler.fingerprint(
+                "SELECT  * FROM t WHERE id IN (%s, %s) AND name = 'it''s'"
+                ' LIMIT 21'
+            ),
+            'SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?'
+        )
+
+    def test_queries_and_requests_are_logged(self):
+        """Медленные запросы пишутся с отпечатком, страницей и местом."""
+        records = self.records(reverse('posts:index'))
+        queries = [record for record in records if record['event'] == 'query']
+        self.assertTrue(queries)
+        for record in queries:
+            self.assertEqual(record['view'], 'posts:index')
+            self.assertNotIn('%s', record['fingerprint'])
+            self.assertTrue(record['origin'])
+        request, = [
+            record for record in records if record['event'] == 'request'
+        ]
+        self.assertEqual(request['status'], 200)
+        self.assertFalse(request['sampled'])
+
+    @override_settings(
+        SLOW_REQUEST_SECONDS=60, PROFILE_SAMPLE_RATE=1,
+        TRACEMALLOC_SAMPLE_RATE=1
+    )
+    def test_sampled_profile(self):
+        """Выбранный запрос пишется с профилем даже если он быстрый."""
+        request, = [
+            record for record in self.records(reverse('posts:index'))
+            if record['event'] == 'request'
+        ]
+        self.assertTrue(request['sampled'])
+        self.assertIn('cumulative', request['profile'])
+        self.assertGreater(request['memory_peak'], 0)
+        self.assertTrue(request['allocations'])
+
+    @override_settings(TRACEMALLOC_SAMPLE_RATE=1)
+    def test_one_memory_sample_at_a_time(self):
+        """Второй запрос не трогает трассировку, начатую первым."""
+        with sampler.Sample() as first:
+            second = sampler.Sample()
+            with second:
+                pass
+            self.assertTrue(tracemalloc.is_tracing())
+        self.assertTrue(first.tracing)
+        self.assertFalse(second.tracing)
+        self.assertFalse(tracemalloc.is_tracing())
+        with sampler.Sample() as third:
+            pass
+        self.assertTrue(third.tracing)
+
+    def test_report(self):
+        """Команда report складывает записи по отпечаткам."""
+        records = self.records(reverse('posts:index'))
+        records += self.records(reverse('posts:index'))
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'slow.log')
+        with open(path, 'w') as log:
+            log.write('не JSON\n')
+            log.writelines(json.dumps(record) + '\n' for record in records)
+        output = StringIO()
+        call_command('report', path, '--json', stdout=output)
+        result = json.loads(output.getvalue())
+        self.assertEqual(result['request'][0]['name'], 'posts:index')
+        self.assertEqual(result['request'][0]['count'], 2)
+        self.assertEqual(
+            sum(row['count'] for row in result['query']),
+            len([record for record in records if record['event'] == 'query'])
+        )
+        call_command('report', path, stdout=StringIO())
+
+
+class CacheFetchTests(SimpleTestCase):
+    def setUp(self):
+        default_cache.clear()
+        metrics.reset()
+        self.addCleanup(default_cache.clear)
+        self.addCleanup(metrics.reset)
+
+    def test_cached_value(self):
+        compute = mock.Mock(return_value='value')
+        self.assertEqual(core_cache.fetch('key', compute, 60), 'value')
+        self.assertEqual(core_cache.fetch('key', compute, 60), 'value')
+        self.assertEqual(compute.call_count, 1)
+        self.assertEqual(
+            metrics.events('cache_fetch'), {'miss': 1, 'hit': 1}
+        )
+
+    def test_stale_while_revalidate(self):
+        """Пока другой процесс пересчитывает, отдается старое значение."""
+        default_cache.set('key', ('old', 0.1, time.time() - 1), 60)
+        default_cache.add('lock:key', 1)
+        compute = mock.Mock(return_value='new')
+        self.assertEqual(core_cache.fetch('key', compute, 60), 'old')
+        compute.assert_not_called()
+        default_cache.delete('lock:key')
+        self.assertEqual(core_cache.fetch('key', compute, 60), 'new')
+        self.assertEqual(
+            metrics.events('cache_fetch'), {'stale': 1, 'expired': 1}
+        )
+
+    def test_versions_keep_concurrent_bump(self):
+        """Первое чтение версии не перетирает параллельный bump()."""
+        get_many = default_cache.get_many
+        calls = []
+
+        def read(keys):
+            calls.append(keys)
+            if len(calls) == 1:
+                # Другой процесс записал версию сразу после промаха.
+                default_cache.set('version:scope', 5, None)
+                return {}
+            return get_many(keys)
+
+        with mock.patch.object(default_cache, 'get_many', side_effect=read):
+            self.assertEqual(core_cache.versions('scope'), '5')
+
+    def test_bump_tracks_time(self):
+        """Версия после bump() не меньше текущего времени и растет
+        даже в пределах одной миллисекунды."""
+        default_cache.set('version:scope', 5, None)
+        before = time.time()
+        core_cache.bump('scope')
+        first = core_cache.versions('scope')
+        self.assertGreaterEqual(
+            core_cache.changed_at(first).timestamp(), int(before)
+        )
+        with mock.patch.object(
+            core_cache, '_initial', return_value=int(first)
+        ):
+            core_cache.bump('scope')
+        self.assertEqual(int(core_cache.versions('scope')), int(first) + 1)
+
+    @override_settings(CACHE_XFETCH_BETA=10 ** 9)
+    def test_early_recompute(self):
+        """Долгий пересчет начинается до истечения записи."""
+        default_cache.set('key', ('old', 1.0, time.time() + 30), 60)
+        self.assertEqual(core_cache.fetch('key', lambda: 'new', 60), 'new')
+        self.assertEqual(metrics.events('cache_fetch'), {'early': 1})
+
+    def test_concurrent_misses_are_coalesced(self):
+        """Одновременные промахи ждут единственного пересчета."""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    core_cache.fetch('key', compute, 60)
+                )
+            )
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['value'] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(
+            metrics.events('cache_fetch'), {'miss': 1, 'coalesced': 4}
+        )
+
+    @override_settings(CACHE_LOCK_WAIT=0)
+    def test_lock_timeout(self):
+        default_cache.add('lock:key', 1)
+        self.assertEqual(core_cache.fetch('key', lambda: 'value', 60), 'value')
+        self.assertEqual(metrics.events('cache_fetch'), {'lock_timeout': 1})
+        self.assertIn(
+            'yatube_cache_fetch_total{result="lock_timeout"} 1',
+            metrics.render()
+        )
+
+
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        default_cache.clear()
+        metrics.reset()
+        self.addCleanup(default_cache.clear)
+        self.addCleanup(metrics.reset)
+
+    def test_local_cache_is_bounded_by_bytes(self):
+        local = tiered.LocalCache(max_bytes=10, ttl=60)
+        local.set('a', b'1234')
+        local.set('b', b'1234')
+        local.get('a')
+        local.set('c', b'1234')
+        self.assertEqual(list(local.entries), ['a', 'c'])
+        self.assertEqual(local.size, 8)
+        local.set('huge', b'x' * 11)
+        self.assertIsNone(local.get('huge'))
+        self.assertEqual(metrics.events('tiered_cache'), {'evicted': 1})
+
+    def test_local_cache_expiry(self):
+        local = tiered.LocalCache(max_bytes=10, ttl=0)
+        local.set('a', b'1')
+        self.assertIsNone(local.get('a'))
+        self.assertEqual(local.size, 0)
+
+    def test_tiers(self):
+        """Промах читает общий кэш, повторное чтение — память процесса."""
+        compute = mock.Mock(return_value='value')
+        for _ in range(2):
+            self.assertEqual(
+                tiered.get_or_set('key', compute, 60, scope='scope'), 'value'
+            )
+        tiered.local().clear()
+        tiered.get_or_set('key', compute, 60, scope='scope')
+        self.assertEqual(compute.call_count, 1)
+        self.assertEqual(
+            metrics.events('tiered_cache'),
+            {'miss': 1, 'local_hit': 1, 'shared_hit': 1}
+        )
+        self.assertIn(
+            'yatube_tiered_cache_total{result="local_hit"} 1',
+            metrics.render()
+        )
+
+    def test_invalidation_reaches_other_processes(self):
+        """Чужая инвалидация видна после срока жизни версии области."""
+        tiered.get_or_set('key', lambda: 'old', 60, scope='scope')
+        core_cache.bump('scope')
+        self.assertEqual(
+            tiered.get_or_set('key', lambda: 'new', 60, scope='scope'), 'old'
+        )
+        with override_settings(LOCAL_CACHE_STAMP_TTL=0):
+            tiered._stamps.clear()
+            self.assertEqual(
+                tiered.get_or_set('key', lambda: 'new', 60, scope='scope'),
+                'new'
+            )
+        tiered.invalidate('scope')
+        self.assertEqual(
+            tiered.get_or_set('key', lambda: 'newer', 60, scope='scope'),
+            'newer'
+        )
+
+
+@override_settings(CACHE_SHARED=True)
+class CompressionTests(TestCase):
+    def setUp(self):
+        default_cache.clear()
+        metrics.reset()
+        self.addCleanup(default_cache.clear)
+        self.addCleanup(metrics.reset)
+
+    @override_settings(COMPRESSION_ENCODINGS=('gzip',))
+    def test_negotiate(self):
+        data = {
+            'gzip, deflate': 'gzip',
+            'GZIP;q=0.5': 'gzip',
+            'br': None,
+            'gzip;q=0, *': None,
+            '*': 'gzip',
+            '': None,
+        }
+        for accept_encoding, expected in data.items():
+            with self.subTest(accept_encoding=accept_encoding):
+                self.assertEqual(
+                    compression.negotiate(accept_encoding), expected
+                )
+
+    @override_settings(COMPRESSION_ENCODINGS=('gzip',))
+    def test_cached_page_is_compressed_once(self):
+        """Сжатый вариант страницы берется из кэша по ETag."""
+        url = reverse('posts:index')
+        plain = self.client.get(url)
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+        for _ in range(2):
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(gzip.decompress(response.content), plain.content)
+            self.assertEqual(
+                int(response['Content-Length']), len(response.content)
+            )
+        self.assertEqual(
+            metrics.events('compression'), {'compressed': 1, 'reused': 1}
+        )
+
+    def test_pages_without_etag_are_not_cached(self):
+        self.client.get(reverse('about:author'), HTTP_ACCEPT_ENCODING='gzip')
+        self.client.get(reverse('about:author'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(metrics.events('compression'), {'compressed': 2})
+
+    @skipUnless(compression.brotli, 'brotli не установлен')
+    def test_brotli(self):
+        response = self.client.get(
+            reverse('posts:index'), HTTP_ACCEPT_ENCODING='gzip, br'
+        )
+        self.assertEqual(response['Content-Encoding'], 'br')
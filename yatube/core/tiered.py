@@ -0,0 +1,162 @@
+"""Двухуровневый кэш: память процесса перед общим кэшем.
+
+Первый уровень — LRU в памяти процесса с ограничением по байтам
+(``settings.LOCAL_CACHE_MAX_BYTES``) и сроком жизни записей
+(``settings.LOCAL_CACHE_TTL``). Значения хранятся сериализованными:
+каждый запрос получает свою копию объекта, а размер записи известен
+точно. Промах первого уровня читает общий кэш, промах обоих —
+вычисляет значение.
+
+Записи с областью (``scope``) входят в ключ с версией области из
+``core.cache``. ``invalidate`` увеличивает версию в общем кэше, и все
+процессы перестают видеть старые записи, как только перечитают версию:
+процесс помнит версии не дольше ``settings.LOCAL_CACHE_STAMP_TTL``
+секунд, а в своем процессе инвалидация видна сразу.
+
+Попадания в каждый уровень, промахи и вытеснения считаются
+в ``core.metrics`` как ``yatube_tiered_cache_total``.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+from .cache import bump, versions
+
+
+class LocalCache:
+    """LRU с ограничением суммарного размера значений в байтах."""
+
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Сериализованное значение или None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            data, expires = entry
+            if expires <= time.monotonic():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return data
+
+    def set(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (data, time.monotonic() + self.ttl)
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                metrics.count_event('tiered_cache', 'evicted')
+
+    def _remove(self, key):
+        data, _ = self.entries.pop(key)
+        self.size -= len(data)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+_local = None
+_stamps = {}
+_lock = threading.Lock()
+
+
+def local():
+    global _local
+    with _lock:
+        if _local is None:
+            _local = LocalCache(
+                settings.LOCAL_CACHE_MAX_BYTES, settings.LOCAL_CACHE_TTL
+            )
+    return _local
+
+
+def stamp(scope):
+    """Версия области, перечитываемая из общего кэша не чаще
+    ``LOCAL_CACHE_STAMP_TTL`` секунд."""
+    now = time.monotonic()
+    found = _stamps.get(scope)
+    if found is not None and found[1] > now:
+        return found[0]
+    version = versions(scope)
+    _stamps[scope] = (version, now + settings.LOCAL_CACHE_STAMP_TTL)
+    return version
+
+
+def clear():
+    """Сбрасывает память процесса, например вместе с общим кэшем."""
+    local().clear()
+    _stamps.clear()
+
+
+def invalidate(*scopes):
+    bump(*scopes)
+    for scope in scopes:
+        _stamps.pop(scope, None)
+
+
+def scoped(key, scope):
+    return key if scope is None else f'{key}:{stamp(scope)}'
+
+
+def get_many(keys, scope=None):
+    """Найденные значения по ключам: сначала из памяти процесса,
+    остальные одним запросом к общему кэшу."""
+    names = {scoped(key, scope): key for key in keys}
+    found = {}
+    remote = []
+    for name, key in names.items():
+        data = local().get(name)
+        if data is None:
+            remote.append(name)
+        else:
+            found[key] = pickle.loads(data)
+    if found:
+        metrics.count_event('tiered_cache', 'local_hit', len(found))
+    if remote:
+        shared = cache.get_many(remote)
+        for name, value in shared.items():
+            local().set(name, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+            found[names[name]] = value
+        if shared:
+            metrics.count_event('tiered_cache', 'shared_hit', len(shared))
+        if len(remote) > len(shared):
+            metrics.count_event(
+                'tiered_cache', 'miss', len(remote) - len(shared)
+            )
+    return found
+
+
+def set_many(data, timeout, scope=None):
+    named = {scoped(key, scope): value for key, value in data.items()}
+    cache.set_many(named, timeout)
+    for name, value in named.items():
+        local().set(name, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+def get_or_set(key, compute, timeout, scope=None):
+    """Значение из любого уровня или ``compute()``; None не кэшируется."""
+    found = get_many([key], scope)
+    if key in found:
+        return found[key]
+    value = compute()
+    if value is not None:
+        set_many({key: value}, timeout, scope)
+    return value
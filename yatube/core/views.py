@@ -1,5 +1,11 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from . import metrics as request_metrics
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -15,3 +21,17 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', {'path': request.path}, status=403)
+
+
+def metrics(request):
+    # Адрес клиента за локальным прокси всегда 127.0.0.1, поэтому
+    # доступ дает только токен; без токена в настройках метрик нет.
+    token = settings.METRICS_TOKEN
+    if not token or not hmac.compare_digest(
+        request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'
+    ):
+        raise Http404
+    return HttpResponse(
+        request_metrics.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -1,5 +1,7 @@
+from django.conf import settings
 from django.contrib import admin
 
+from . import search
 from .models import Comment, Follow, Group, Post
 
 
@@ -16,6 +18,13 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return queryset.filter(
+            pk__in=search.search_ids(search_term, settings.SEARCH_ADMIN_LIMIT)
+        ), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
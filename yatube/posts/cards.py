@@ -0,0 +1,76 @@
+"""Кэш отрисованных карточек постов.
+
+Карточка ``posts/includes/post.html`` кэшируется по id поста и дате
+его изменения, поэтому правка поста сама делает старую запись
+недоступной. Изменения, которые видны в карточке, но хранятся не в
+посте (название группы, имя автора), меняют версии областей
+``author_scope`` и ``group_scope`` из ``core.cache``, которые тоже
+входят в ключ (см. ``posts.signals``). Карточки страницы читаются
+из памяти процесса и общего кэша (``core.tiered``) одним ``get_many``,
+отрисовываются только недостающие.
+Карточки с картинкой, у которой еще нет всех миниатюр, не кэшируются,
+чтобы заглушка не задержалась в кэше.
+"""
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from core import tiered
+from core.cache import versions
+
+from . import thumbnails
+
+
+def author_scope(author_id):
+    return f'author-card:{author_id}'
+
+
+def group_scope(group_id):
+    return f'group-card:{group_id}'
+
+
+def scopes(post):
+    if post.group_id is None:
+        return (author_scope(post.author_id),)
+    return author_scope(post.author_id), group_scope(post.group_id)
+
+
+def stamps(posts):
+    """Версии имен авторов и названий групп постов одним запросом."""
+    names = sorted({scope for post in posts for scope in scopes(post)})
+    if not names:
+        return {}
+    return dict(zip(names, versions(*names).split('.')))
+
+
+def key(post, hide_group=False, current=None):
+    """Ключ карточки; ``current`` — версии из ``stamps``."""
+    if current is None:
+        current = stamps([post])
+    return ':'.join((
+        'card',
+        str(post.pk),
+        str(post.updated_at.timestamp()),
+        str(int(hide_group)),
+        *(f'{scope}={current[scope]}' for scope in scopes(post)),
+    ))
+
+
+def render(posts, hide_group=False):
+    """HTML карточек постов в исходном порядке."""
+    posts = list(posts)
+    current = stamps(posts)
+    keys = [key(post, hide_group, current) for post in posts]
+    found = tiered.get_many(keys)
+    missing = {}
+    for post, card_key in zip(posts, keys):
+        if card_key in found:
+            continue
+        found[card_key] = render_to_string(
+            'posts/includes/post.html',
+            {'post': post, 'hide_group': hide_group}
+        )
+        if thumbnails.ready(post.image):
+            missing[card_key] = found[card_key]
+    if missing:
+        tiered.set_many(missing, settings.POSTS_CARD_CACHE)
+    return [found[card_key] for card_key in keys]
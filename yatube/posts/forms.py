@@ -1,5 +1,9 @@
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.template.defaultfilters import filesizeformat
 
+from . import uploads
 from .models import Post, Comment
 
 
@@ -8,6 +12,32 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        upload = self.files.get('image')
+        self.upload_error = getattr(upload, 'upload_error', None)
+        if self.upload_error:
+            # Отвергнутый обработчиком загрузки файл пуст, ImageField
+            # не должен его проверять.
+            self.files = self.files.copy()
+            del self.files['image']
+
+    def clean_image(self):
+        """Лимиты на размер файла и число точек, поворот по EXIF."""
+        image = self.cleaned_data['image']
+        error = self.upload_error
+        if not error and isinstance(image, UploadedFile):
+            limit = settings.POSTS_IMAGE_MAX_BYTES
+            if image.size > limit:
+                error = uploads.TOO_LARGE.format(limit=filesizeformat(limit))
+            else:
+                error = uploads.check_size(*image.image.size)
+        if error:
+            raise forms.ValidationError(error, code='limit')
+        if isinstance(image, UploadedFile):
+            return uploads.normalize(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.models import User
+from posts.timeline import demote, rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Перестраивает ленты подписок. С именами авторов снимает флаг '
+        'знаменитости только с них и раскладывает их посты.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*')
+
+    def handle(self, *args, **options):
+        if not options['usernames']:
+            self.stdout.write(f'Записей в лентах: {rebuild()}')
+            return
+        for username in options['usernames']:
+            author = User.objects.filter(username=username).first()
+            if author is None:
+                raise CommandError(f'Пользователь {username} не найден')
+            added = demote(author)
+            if added is None:
+                self.stdout.write(f'{username}: остается знаменитостью')
+            else:
+                self.stdout.write(f'{username}: добавлено записей {added}')
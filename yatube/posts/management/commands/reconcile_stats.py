@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from posts.stats import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики профилей и комментариев постов.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Исправлено записей: {reconcile()}')
@@ -0,0 +1,38 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.seed import seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу пользователями, группами, постами, комментариями '
+        'и подписками со степенным распределением популярности.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument('--follows', type=int, default=100000)
+        parser.add_argument('--batch', type=int, default=5000)
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--seed', type=int, help='Зерно генератора.')
+
+    def handle(self, *args, **options):
+        if options['posts'] and not options['users']:
+            raise CommandError('Для постов нужен хотя бы один пользователь.')
+        random.seed(options['seed'])
+        counts = seed(
+            options['users'],
+            options['posts'],
+            options['comments'],
+            options['follows'],
+            options['groups'],
+            batch=options['batch'],
+            days=options['days'],
+        )
+        self.stdout.write(json.dumps(counts, ensure_ascii=False, indent=2))
@@ -0,0 +1,20 @@
+"""Отображение текстов постов и комментариев.
+
+HTML текста и короткий заголовок вычисляются один раз при записи
+(``Post.save``, ``Comment.save``, а также ``update`` и ``bulk_create``
+их наборов записей) и хранятся рядом с текстом, поэтому страницы
+выводят готовый HTML без обработки строк. Сюда же ляжет разметка
+упоминаний и ссылок.
+"""
+from django.conf import settings
+from django.template.defaultfilters import linebreaksbr
+from django.utils.text import Truncator
+
+
+def text_html(text):
+    """Экранированный текст с ``<br>`` вместо переводов строк."""
+    return linebreaksbr(text, autoescape=True)
+
+
+def short_title(text):
+    return Truncator(text).chars(settings.POSTS_TITLE_LENGTH)
@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.db import migrations
+
+# Схема индекса на момент миграции; рабочий модуль posts.search может
+# меняться, не задевая историю миграций.
+FTS_TABLE = 'posts_post_fts'
+PG_TABLE = 'posts_post_search'
+SQLITE_CREATE = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+    'USING fts5(text, grp, author, '
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+SQLITE_INSERT = (
+    f'INSERT INTO {FTS_TABLE} (rowid, text, grp, author) '
+    'VALUES (%s, %s, %s, %s)'
+)
+PG_CREATE = (
+    f'CREATE TABLE IF NOT EXISTS {PG_TABLE} ('
+    'post_id integer PRIMARY KEY '
+    'REFERENCES posts_post (id) ON DELETE CASCADE DEFERRABLE INITIALLY '
+    'DEFERRED, document tsvector NOT NULL)',
+    f'CREATE INDEX IF NOT EXISTS {PG_TABLE}_document '
+    f'ON {PG_TABLE} USING GIN (document)',
+)
+PG_INSERT = (
+    f'INSERT INTO {PG_TABLE} (post_id, document) VALUES (%s, '
+    'setweight(to_tsvector(%s::regconfig, %s), \'A\') || '
+    'setweight(to_tsvector(%s::regconfig, %s), \'B\') || '
+    'setweight(to_tsvector(%s::regconfig, %s), \'B\')) '
+    'ON CONFLICT (post_id) DO NOTHING'
+)
+
+
+def documents(posts):
+    for post in posts.select_related('author', 'group'):
+        yield (
+            post.pk,
+            post.text,
+            post.group.title if post.group else '',
+            ' '.join((
+                post.author.username,
+                post.author.first_name,
+                post.author.last_name,
+            )),
+        )
+
+
+def write_rows(cursor, vendor, rows):
+    if vendor == 'sqlite':
+        cursor.executemany(SQLITE_INSERT, rows)
+    elif vendor == 'postgresql':
+        config = settings.SEARCH_CONFIG
+        cursor.executemany(PG_INSERT, [
+            (pk, config, text, config, group, config, author)
+            for pk, text, group, author in rows
+        ])
+
+
+def build_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_CREATE)
+    elif vendor == 'postgresql':
+        for sql in PG_CREATE:
+            schema_editor.execute(sql)
+    else:
+        return
+    Post = apps.get_model('posts', 'Post')
+    pks = list(Post.objects.values_list('pk', flat=True))
+    batch = settings.SEARCH_BATCH
+    with schema_editor.connection.cursor() as cursor:
+        for start in range(0, len(pks), batch):
+            write_rows(cursor, vendor, list(documents(
+                Post.objects.filter(pk__in=pks[start:start + batch])
+            )))
+
+
+def remove_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {PG_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0003_userstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_index, remove_index),
+    ]
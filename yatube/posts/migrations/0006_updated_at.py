@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:06
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_dates(apps, schema_editor):
+    """Существующие записи считаются не изменявшимися с публикации."""
+    apps.get_model('posts', 'Post').objects.update(updated_at=F('pub_date'))
+    apps.get_model('posts', 'Comment').objects.update(
+        updated_at=F('created')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.RunPython(copy_dates, migrations.RunPython.noop),
+    ]
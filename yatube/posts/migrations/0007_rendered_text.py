@@ -0,0 +1,60 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:09
+
+from django.db import migrations, models
+from django.template.defaultfilters import linebreaksbr
+from django.utils.text import Truncator
+
+BATCH = 1000
+# Длина заголовка на момент миграции; рабочий модуль posts.markup
+# может меняться, не задевая историю миграций.
+TITLE_LENGTH = 30
+
+
+def text_html(text):
+    return linebreaksbr(text, autoescape=True)
+
+
+def short_title(text):
+    return Truncator(text).chars(TITLE_LENGTH)
+
+
+def render_texts(apps, schema_editor):
+    for name, fields in (('Post', ['text_html', 'title']),
+                         ('Comment', ['text_html'])):
+        model = apps.get_model('posts', name)
+        objs = []
+        for obj in model.objects.only('text').iterator(chunk_size=BATCH):
+            obj.text_html = text_html(obj.text)
+            if 'title' in fields:
+                obj.title = short_title(obj.text)
+            objs.append(obj)
+            if len(objs) == BATCH:
+                model.objects.bulk_update(objs, fields)
+                objs = []
+        model.objects.bulk_update(objs, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='text_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='HTML текста'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='text_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='HTML текста'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='title',
+            field=models.CharField(blank=True, editable=False, max_length=30, verbose_name='Заголовок'),
+        ),
+        migrations.RunPython(render_texts, migrations.RunPython.noop),
+    ]
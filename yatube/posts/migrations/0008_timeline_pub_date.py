@@ -0,0 +1,41 @@
+# Generated by Django 2.2.16 on 2026-10-18 09:12
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.utils.timezone
+
+
+def copy_dates(apps, schema_editor):
+    """Дата записи ленты — дата публикации поста."""
+    Post = apps.get_model('posts', 'Post')
+    apps.get_model('posts', 'TimelineEntry').objects.update(
+        pub_date=Subquery(
+            Post.objects.filter(pk=OuterRef('post')).values('pub_date')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_rendered_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timelineentry',
+            name='pub_date',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата публикации'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_dates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='timeline_user_pub_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='celebrity',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Посты не раскладываются по лентам'),
+        ),
+    ]
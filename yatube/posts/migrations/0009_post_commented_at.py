@@ -0,0 +1,32 @@
+# Generated by Django 2.2.16 on 2026-10-18 14:05
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+def copy_dates(apps, schema_editor):
+    """Дата изменения комментариев — последняя правка комментария."""
+    Comment = apps.get_model('posts', 'Comment')
+    apps.get_model('posts', 'Post').objects.update(
+        commented_at=Subquery(
+            Comment.objects.filter(post=OuterRef('pk')).order_by().values(
+                'post'
+            ).annotate(last=Max('updated_at')).values('last')
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_timeline_pub_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='commented_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Дата изменения комментариев'),
+        ),
+        migrations.RunPython(copy_dates, migrations.RunPython.noop),
+    ]
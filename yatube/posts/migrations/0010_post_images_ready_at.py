@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_post_commented_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='images_ready_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Дата готовности миниатюр'),
+        ),
+    ]
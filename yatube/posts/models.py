@@ -2,6 +2,8 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from . import markup
+
 User = get_user_model()
 
 
@@ -27,16 +29,89 @@ class Group(models.Model):
         return self.title
 
 
-class Post(models.Model):
+class RenderedTextQuerySet(models.QuerySet):
+    """Поддерживает HTML текста при массовых вставках и обновлениях."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.render_text()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def update(self, **kwargs):
+        # Выражения вместо строки не пересчитываются.
+        if isinstance(kwargs.get('text'), str):
+            kwargs.update(self.model.rendered_fields(kwargs['text']))
+        return super().update(**kwargs)
+
+
+class PostQuerySet(RenderedTextQuerySet):
+    def for_listing(self):
+        """Посты с автором и группой одним запросом и только с полями,
+        которые выводит карточка поста.
+        """
+        return self.select_related('author', 'group').only(
+            'text_html',
+            'pub_date',
+            'updated_at',
+            'image',
+            'author',
+            'author__username',
+            'author__first_name',
+            'author__last_name',
+            'group',
+            'group__slug',
+            'group__title',
+        )
+
+
+class RenderedText(models.Model):
+    """Текст с HTML, вычисленным при сохранении."""
+
+    text_html = models.TextField(
+        'HTML текста',
+        blank=True,
+        editable=False
+    )
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def rendered_fields(cls, text):
+        return {'text_html': markup.text_html(text)}
+
+    def render_text(self):
+        for name, value in self.rendered_fields(self.text).items():
+            setattr(self, name, value)
+
+    def save(self, *args, update_fields=None, **kwargs):
+        self.render_text()
+        if update_fields is not None and 'text' in update_fields:
+            update_fields = {*update_fields, *self.rendered_fields('')}
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+
+class Post(RenderedText):
     text = models.TextField(
         'Текст поста',
         help_text='Введите текст'
     )
+    title = models.CharField(
+        'Заголовок',
+        max_length=settings.POSTS_TITLE_LENGTH,
+        blank=True,
+        editable=False
+    )
     pub_date = models.DateTimeField(
         'Дата публикации',
         auto_now_add=True,
         db_index=True
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -57,17 +132,53 @@ class Post(models.Model):
         upload_to=settings.POSTS_IMAGE_FOLDER,
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False
+    )
+    commented_at = models.DateTimeField(
+        'Дата изменения комментариев',
+        blank=True,
+        null=True,
+        editable=False
+    )
+    images_ready_at = models.DateTimeField(
+        'Дата готовности миниатюр',
+        blank=True,
+        null=True,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date', )
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    @classmethod
+    def rendered_fields(cls, text):
+        return {
+            **super().rendered_fields(text),
+            'title': markup.short_title(text),
+        }
+
 
-class Comment(models.Model):
+class Comment(RenderedText):
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -89,11 +200,23 @@ class Comment(models.Model):
         auto_now_add=True,
         db_index=True
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
+
+    objects = RenderedTextQuerySet.as_manager()
 
     class Meta:
         ordering = ('-created',)
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -116,9 +239,70 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx',
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'author'],
                 name='unique_following',
             ),
         ]
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry',
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts = models.PositiveIntegerField('Постов', default=0)
+    followers = models.PositiveIntegerField('Подписчиков', default=0)
+    following = models.PositiveIntegerField('Подписок', default=0)
+    comments = models.PositiveIntegerField('Комментариев', default=0)
+    celebrity = models.BooleanField(
+        'Посты не раскладываются по лентам',
+        default=False,
+        editable=False
+    )
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
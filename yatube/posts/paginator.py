@@ -0,0 +1,214 @@
+"""Курсорная (keyset) пагинация.
+
+Страница выбирается условием ``(поле, ключ) < (значение, ключ)`` по индексу
+вместо ``OFFSET``, а общее число записей не считается вовсе. Курсор —
+непрозрачная строка для параметра ``?cursor=``; ``?date=ГГГГ-ММ-ДД``
+открывает ленту с постов, опубликованных не позже этой даты. Номер
+такой страницы неизвестен и равен 0.
+
+Старые ссылки вида ``?page=N`` обслуживает унаследованная
+постраничная логика; навигация по ним выводит окно номеров вокруг
+текущей страницы с пропусками, а не все номера.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.functional import cached_property
+
+FORWARD = 'next'
+BACKWARD = 'prev'
+ELLIPSIS = '…'
+
+
+def encode_cursor(value, pk, direction, number):
+    data = json.dumps([value.isoformat(), pk, direction, number])
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Возвращает (значение, pk, направление, номер) или None."""
+    if not cursor:
+        return None
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, pk, direction, number = json.loads(data.decode())
+        value = parse_datetime(value)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    if (
+        value is None
+        or direction not in (FORWARD, BACKWARD)
+        or not isinstance(pk, int)
+        or not isinstance(number, int)
+    ):
+        return None
+    return value, pk, direction, max(number, 0)
+
+
+class CursorPaginator(Paginator):
+    ELLIPSIS = ELLIPSIS
+
+    def __init__(self, object_list, per_page, field='pub_date', key='pk',
+                 approximate=False, **kwargs):
+        self.field = field
+        self.key = key
+        self.approximate = approximate
+        super().__init__(
+            object_list.order_by(f'-{field}', f'-{key}'), per_page, **kwargs
+        )
+
+    def page(self, number):
+        """Страница по номеру с окном навигации ``page_window``."""
+        page = super().page(number)
+        page.page_window = list(self.elided_page_range(page.number))
+        return page
+
+    def cursor_page(self, cursor=None):
+        """Страница, следующая за курсором (или первая без курсора)."""
+        decoded = decode_cursor(cursor)
+        if decoded is None:
+            return self.seek(None, None, FORWARD, 1)
+        return self.seek(*decoded)
+
+    def date_page(self, date):
+        """Страница с записей не позже даты ``ГГГГ-ММ-ДД``.
+
+        Неверная или последняя представимая дата открывает первую
+        страницу.
+        """
+        try:
+            date = parse_date(date or '')
+            value = date and timezone.make_aware(
+                datetime.combine(date + timedelta(days=1), time.min)
+            )
+        except (ValueError, OverflowError):
+            value = None
+        if value is None:
+            return self.cursor_page()
+        return self.seek(value, 0, FORWARD, 0)
+
+    def seek(self, value, pk, direction, number):
+        """Страница после (или перед) ключом ``(value, pk)``.
+
+        Номер 0 означает неизвестную позицию и сохраняется у соседних
+        страниц.
+        """
+        step = 1 if number else 0
+        queryset = self.object_list
+        if direction == BACKWARD:
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__gt': value})
+                | Q(**{self.field: value, f'{self.key}__gt': pk})
+            ).order_by(self.field, self.key)
+        elif value is not None:
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__lt': value})
+                | Q(**{self.field: value, f'{self.key}__lt': pk})
+            )
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == BACKWARD:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, value is not None
+        page = self._get_page(rows, number, self)
+        page.keyset = True
+        page.next_cursor = (
+            self.cursor_for(rows[-1], FORWARD, number + step)
+            if has_next and rows else None
+        )
+        page.previous_cursor = (
+            self.cursor_for(rows[0], BACKWARD, number - step)
+            if has_previous and rows else None
+        )
+        return page
+
+    def cursor_for(self, obj, direction, number):
+        return encode_cursor(
+            getattr(obj, self.field), getattr(obj, self.key), direction,
+            number
+        )
+
+    def page_state(self, page):
+        """Данные страницы для кэша, без ссылок на queryset."""
+        return (
+            list(page),
+            page.number,
+            {
+                name: getattr(page, name)
+                for name in (
+                    'keyset', 'next_cursor', 'previous_cursor', 'page_window'
+                )
+                if hasattr(page, name)
+            },
+        )
+
+    def restore_page(self, state):
+        rows, number, attributes = state
+        page = self._get_page(rows, number, self)
+        for name, value in attributes.items():
+            setattr(page, name, value)
+        return page
+
+    def elided_page_range(self, number, on_each_side=None, on_ends=None):
+        """Номера страниц вокруг текущей и по краям с ``ELLIPSIS``
+        на месте пропусков (аналог метода из Django 3.2).
+
+        Длина не зависит от числа страниц.
+        """
+        if on_each_side is None:
+            on_each_side = settings.PAGINATOR_ON_EACH_SIDE
+        if on_ends is None:
+            on_ends = settings.PAGINATOR_ON_ENDS
+        number = self.validate_number(number)
+        if self.num_pages <= (on_each_side + on_ends) * 2:
+            yield from self.page_range
+            return
+        if number > 1 + on_each_side + on_ends + 1:
+            yield from range(1, on_ends + 1)
+            yield ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < self.num_pages - on_each_side - on_ends - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield ELLIPSIS
+            yield from range(self.num_pages - on_ends + 1, self.num_pages + 1)
+        else:
+            yield from range(number + 1, self.num_pages + 1)
+
+    @cached_property
+    def approximate_count(self):
+        """Дешевая оценка числа записей.
+
+        Для PostgreSQL берется оценка планировщика, для остальных баз —
+        точный подсчет, ограниченный ``settings.PAGINATOR_COUNT_LIMIT``.
+        """
+        queryset = self.object_list.order_by()
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows'])
+        return queryset[:settings.PAGINATOR_COUNT_LIMIT].count()
+
+    @property
+    def count_is_capped(self):
+        return (
+            connections[self.object_list.db].vendor != 'postgresql'
+            and self.approximate_count >= settings.PAGINATOR_COUNT_LIMIT
+        )
@@ -0,0 +1,218 @@
+"""Полнотекстовый поиск по постам, группам и авторам.
+
+Инвертированный индекс хранится рядом с постами и обновляется
+сигналами: на SQLite это виртуальная таблица FTS5, на PostgreSQL —
+таблица с ``tsvector`` под GIN-индексом. Для прочих баз поиск
+деградирует до ``icontains``. Выдача упорядочена по релевантности,
+постраничная навигация — курсорами ``(score, id)``.
+"""
+import base64
+import binascii
+import json
+import re
+
+from django.conf import settings
+from django.core.paginator import Page
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+PG_TABLE = 'posts_post_search'
+MARK_START = '\x02'
+MARK_END = '\x03'
+WORD = re.compile(r'\w+')
+
+
+def documents(posts):
+    """Строки индекса: id, текст, группа и автор поста."""
+    for post in posts.select_related('author', 'group'):
+        yield (
+            post.pk,
+            post.text,
+            post.group.title if post.group else '',
+            ' '.join((
+                post.author.username,
+                post.author.first_name,
+                post.author.last_name,
+            )),
+        )
+
+
+def write_rows(connection, rows, replace=True):
+    """Записывает строки индекса; ``replace=False`` — в пустой индекс."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            if replace:
+                cursor.executemany(
+                    f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                    [(row[0],) for row in rows]
+                )
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, text, grp, author) '
+                'VALUES (%s, %s, %s, %s)',
+                rows
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.executemany(
+                f'INSERT INTO {PG_TABLE} (post_id, document) VALUES (%s, '
+                'setweight(to_tsvector(%s::regconfig, %s), \'A\') || '
+                'setweight(to_tsvector(%s::regconfig, %s), \'B\') || '
+                'setweight(to_tsvector(%s::regconfig, %s), \'B\')) '
+                'ON CONFLICT (post_id) DO UPDATE '
+                'SET document = EXCLUDED.document',
+                [
+                    (
+                        pk,
+                        settings.SEARCH_CONFIG, text,
+                        settings.SEARCH_CONFIG, group,
+                        settings.SEARCH_CONFIG, author,
+                    )
+                    for pk, text, group, author in rows
+                ]
+            )
+
+
+def index_posts(posts, replace=True):
+    """Добавляет или обновляет посты в индексе."""
+    rows = list(documents(posts))
+    if rows:
+        write_rows(connection, rows, replace)
+
+
+def remove_post(pk):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [pk])
+    # В PostgreSQL строку индекса удаляет ON DELETE CASCADE.
+
+
+def rebuild():
+    """Полностью перестраивает индекс, возвращает число постов."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f'TRUNCATE {PG_TABLE}')
+    pks = list(Post.objects.values_list('pk', flat=True))
+    batch = settings.SEARCH_BATCH
+    for start in range(0, len(pks), batch):
+        index_posts(
+            Post.objects.filter(pk__in=pks[start:start + batch]),
+            replace=False
+        )
+    return len(pks)
+
+
+def fts_query(query):
+    """Запрос FTS5: все слова обязательны, последнее — как префикс."""
+    words = WORD.findall(query)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+def encode_cursor(score, pk, number):
+    data = json.dumps([score, pk, number]).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        score, pk, number = json.loads(data.decode())
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    if (
+        not isinstance(score, (int, float))
+        or not isinstance(pk, int)
+        or not isinstance(number, int)
+    ):
+        return None
+    return float(score), pk, max(number, 1)
+
+
+def highlight(snippet):
+    """Экранирует фрагмент и превращает маркеры совпадений в <mark>."""
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+def matches(query, after=None, limit=None):
+    """Список (id, score, snippet) по возрастанию score (лучшие первыми)."""
+    if connection.vendor == 'sqlite':
+        match = fts_query(query)
+        if match is None:
+            return []
+        key = 'rowid'
+        sql = (
+            f'SELECT rowid, bm25({FTS_TABLE}, 10.0, 2.0, 2.0) AS score, '
+            f'snippet({FTS_TABLE}, 0, %s, %s, %s, 32) AS snippet '
+            f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+        )
+        params = [MARK_START, MARK_END, '…', match]
+    elif connection.vendor == 'postgresql':
+        key = 'post_id'
+        sql = (
+            'SELECT s.post_id, -ts_rank(s.document, q) AS score, '
+            'ts_headline(%s::regconfig, p.text, q, %s) AS snippet '
+            f'FROM {PG_TABLE} s JOIN posts_post p ON p.id = s.post_id, '
+            'plainto_tsquery(%s::regconfig, %s) q WHERE s.document @@ q'
+        )
+        params = [
+            settings.SEARCH_CONFIG,
+            f'StartSel={MARK_START}, StopSel={MARK_END}, MaxWords=32',
+            settings.SEARCH_CONFIG,
+            query,
+        ]
+    else:
+        posts = Post.objects.filter(text__icontains=query).order_by('pk')
+        if after:
+            posts = posts.filter(pk__gt=after[1])
+        return [(post.pk, 0.0, post.text) for post in posts[:limit]]
+    sql = f'SELECT {key}, score, snippet FROM ({sql}) AS found'
+    if after:
+        sql += f' WHERE score > %s OR (score = %s AND {key} > %s)'
+        params += [after[0], after[0], after[1]]
+    sql += f' ORDER BY score, {key}'
+    if limit is not None:
+        sql += ' LIMIT %s'
+        params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def search_ids(query, limit=None):
+    return [pk for pk, _, _ in matches(query, limit=limit)]
+
+
+def search(query, cursor=None):
+    """Страница выдачи с постами, подсветкой и курсором продолжения."""
+    decoded = decode_cursor(cursor)
+    after, number = (decoded[:2], decoded[2]) if decoded else (None, 1)
+    found = matches(query, after, settings.POSTS + 1)
+    has_next = len(found) > settings.POSTS
+    found = found[:settings.POSTS]
+    posts = Post.objects.for_listing().in_bulk([pk for pk, _, _ in found])
+    rows = []
+    for pk, score, snippet in found:
+        if pk in posts:
+            post = posts[pk]
+            post.snippet = highlight(snippet)
+            rows.append(post)
+    page = Page(rows, number, None)
+    page.keyset = True
+    page.previous_cursor = None
+    page.next_cursor = (
+        encode_cursor(found[-1][1], found[-1][0], number + 1)
+        if has_next else None
+    )
+    return page
@@ -0,0 +1,205 @@
+"""Генерация данных в масштабе продакшена.
+
+Строки вставляются пачками через ``bulk_create`` в обход сигналов,
+поэтому после вставки счетчики, ленты подписок и поисковый индекс
+пересчитываются целиком. Распределения близки к реальным: подписчики,
+посты и комментарии достаются авторам и постам по степенному закону,
+а немногие «горячие» группы собирают большую часть постов.
+"""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.color import no_style
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+
+from . import search, stats, timeline
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+WORDS = (
+    'лето море город книга друг утро дорога музыка кофе вечер работа '
+    'поезд снег лес река кино фото история идея проект'
+).split()
+# Доля постов без группы.
+NO_GROUP = 0.3
+# Множитель, перемешивающий ранги авторов постов относительно рангов
+# по подписчикам: иначе самые читаемые авторы писали бы и больше всех,
+# и ленты подписок росли бы квадратично.
+SHUFFLE = 7919
+
+
+def zipf(count):
+    """Случайный индекс от 0 до count - 1 с вероятностью ~ 1 / (индекс + 1).
+
+    Непрерывный аналог закона Ципфа: ``(count + 1) ** u`` при
+    равномерном ``u`` распределено с плотностью ~ 1 / x, памяти под веса
+    не нужно.
+    """
+    return int((count + 1) ** random.random()) - 1
+
+
+def text(words):
+    return ' '.join(random.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def next_pk(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+@contextmanager
+def explicit_dates():
+    """Позволяет задать даты постов и комментариев при вставке."""
+    fields = [
+        (Post._meta.get_field('pub_date'), 'auto_now_add'),
+        (Post._meta.get_field('updated_at'), 'auto_now'),
+        (Comment._meta.get_field('created'), 'auto_now_add'),
+        (Comment._meta.get_field('updated_at'), 'auto_now'),
+    ]
+    for field, flag in fields:
+        setattr(field, flag, False)
+    try:
+        yield
+    finally:
+        for field, flag in fields:
+            setattr(field, flag, True)
+
+
+def reset_sequences(*models):
+    """Сдвигает последовательности ключей после вставки с явными id."""
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
+
+
+def batches(total, size):
+    for start in range(0, total, size):
+        yield start, min(size, total - start)
+
+
+def seed_users(count, batch):
+    first = next_pk(User)
+    password = make_password(None)
+    for start, size in batches(count, batch):
+        User.objects.bulk_create(
+            User(
+                pk=first + start + number,
+                username=f'seed_{first + start + number}',
+                first_name=random.choice(WORDS).capitalize(),
+                password=password,
+            )
+            for number in range(size)
+        )
+        UserStats.objects.bulk_create(
+            UserStats(user_id=first + start + number)
+            for number in range(size)
+        )
+    return first
+
+
+def seed_groups(count):
+    first = next_pk(Group)
+    Group.objects.bulk_create(
+        Group(
+            pk=first + number,
+            title=f'Группа {first + number}',
+            slug=f'seed-{first + number}',
+            description=text(12),
+        )
+        for number in range(count)
+    )
+    return first
+
+
+def seed_posts(count, batch, users, groups, days):
+    first = next_pk(Post)
+    now = timezone.now()
+    for start, size in batches(count, batch):
+        dates = [
+            now - timedelta(days=random.uniform(0, days))
+            for _ in range(size)
+        ]
+        Post.objects.bulk_create(
+            Post(
+                pk=first + start + number,
+                author_id=users[0] + (zipf(users[1]) + 1) * SHUFFLE % users[1],
+                group_id=(
+                    None if not groups[1] or random.random() < NO_GROUP
+                    else groups[0] + zipf(groups[1])
+                ),
+                text=text(random.randint(5, 60)),
+                pub_date=date,
+                updated_at=date,
+            )
+            for number, date in enumerate(dates)
+        )
+    return first
+
+
+def seed_comments(count, batch, users, posts):
+    now = timezone.now()
+    for _, size in batches(count, batch):
+        dates = [
+            now - timedelta(seconds=random.uniform(0, 86400))
+            for _ in range(size)
+        ]
+        Comment.objects.bulk_create(
+            Comment(
+                post_id=posts[0] + zipf(posts[1]),
+                author_id=users[0] + random.randrange(users[1]),
+                text=text(random.randint(3, 20)),
+                created=date,
+                updated_at=date,
+            )
+            for date in dates
+        )
+
+
+def seed_follows(count, batch, users):
+    for _, size in batches(count, batch):
+        Follow.objects.bulk_create(
+            (
+                Follow(user_id=user, author_id=author)
+                for user, author in (
+                    (
+                        users[0] + random.randrange(users[1]),
+                        users[0] + zipf(users[1]),
+                    )
+                    for _ in range(size)
+                )
+                if user != author
+            ),
+            ignore_conflicts=True,
+        )
+
+
+def seed(users, posts, comments, follows, groups, batch=5000, days=365,
+         rebuild=True):
+    """Вставляет данные и пересчитывает производные таблицы.
+
+    Возвращает словарь с числом строк в таблицах после вставки.
+    """
+    with explicit_dates():
+        first_user = seed_users(users, batch)
+        first_group = seed_groups(groups)
+        user_range = (first_user, users)
+        first_post = seed_posts(
+            posts, batch, user_range, (first_group, groups), days
+        )
+        if posts:
+            seed_comments(comments, batch, user_range, (first_post, posts))
+        if users > 1:
+            seed_follows(follows, batch, user_range)
+    reset_sequences(User, Group, Post)
+    if rebuild:
+        stats.reconcile()
+        timeline.rebuild()
+        search.rebuild()
+        cache.clear()
+    return {
+        model._meta.model_name: model.objects.count()
+        for model in (User, Group, Post, Comment, Follow)
+    }
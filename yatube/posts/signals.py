@@ -0,0 +1,233 @@
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from core import edge, tiered
+from core.cache import bump
+
+from . import cards, search, stats, timeline
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+PROFILE_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out(instance)
+
+
+@receiver(pre_save, sender=Post)
+def invalidate_previous_group(sender, instance, **kwargs):
+    if instance.pk is None:
+        return
+    group_id = Post.objects.filter(
+        pk=instance.pk
+    ).values_list('group', flat=True).first()
+    if group_id is not None and group_id != instance.group_id:
+        bump(f'group:{group_id}')
+
+
+@receiver(pre_save, sender=Post)
+def reset_images_ready(sender, instance, update_fields, **kwargs):
+    """Миниатюры новой картинки еще не готовы."""
+    if instance.pk is None or instance.images_ready_at is None or (
+        update_fields is not None and 'image' not in update_fields
+    ):
+        return
+    image = Post.objects.filter(
+        pk=instance.pk
+    ).values_list('image', flat=True).first()
+    if image != instance.image.name:
+        instance.images_ready_at = None
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post(sender, instance, **kwargs):
+    bump(
+        'index',
+        f'group:{instance.group_id}',
+        f'profile:{instance.author_id}',
+    )
+    # Старую группу поста сбрасывает ключ самого поста.
+    edge.purge('index', *edge.post_keys([instance]))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment(sender, instance, **kwargs):
+    bump(f'profile:{instance.author_id}')
+    edge.purge(f'post-{instance.post_id}', f'author-{instance.author_id}')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow(sender, instance, **kwargs):
+    bump(f'profile:{instance.author_id}', f'profile:{instance.user_id}')
+    edge.purge(f'author-{instance.author_id}', f'author-{instance.user_id}')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group(sender, instance, **kwargs):
+    # Название группы выводится в карточках постов на всех лентах.
+    bump('posts', cards.group_scope(instance.pk))
+    tiered.invalidate('groups')
+    edge.purge(f'group-{instance.pk}')
+
+
+@receiver(pre_save, sender=User)
+def remember_profile(sender, instance, update_fields, **kwargs):
+    """Запоминает имя до сохранения: от него зависят карточки,
+    поиск и кэши профиля, а полное сохранение пользователя (пароль,
+    ``last_login``) обычно имя не меняет."""
+    instance.previous_profile = None
+    if instance.pk is None or (
+        update_fields is not None
+        and not set(PROFILE_FIELDS) & set(update_fields)
+    ):
+        return
+    instance.previous_profile = User.objects.filter(
+        pk=instance.pk
+    ).values_list(*PROFILE_FIELDS).first()
+
+
+def profile_changed(instance):
+    previous = getattr(instance, 'previous_profile', None)
+    return previous is not None and previous != tuple(
+        getattr(instance, field) for field in PROFILE_FIELDS
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_user(sender, instance, created, **kwargs):
+    if created:
+        # Имя могло принадлежать удаленному пользователю.
+        tiered.invalidate(f'user:{instance.username}')
+        return
+    if not profile_changed(instance):
+        return
+    previous_username = instance.previous_profile[0]
+    if previous_username != instance.username:
+        tiered.invalidate(f'user:{previous_username}')
+    tiered.invalidate(f'user:{instance.username}')
+    edge.purge(f'author-{instance.pk}')
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_user(sender, instance, **kwargs):
+    tiered.invalidate(f'user:{instance.username}')
+    edge.purge(f'author-{instance.pk}')
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_cards(sender, instance, created, **kwargs):
+    if profile_changed(instance):
+        # Имя автора выводится в карточках на всех лентах.
+        bump('posts', cards.author_scope(instance.pk))
+
+
+@receiver(post_save, sender=User)
+def create_stats(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, **kwargs):
+    if created:
+        stats.change(instance.author_id, posts=1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    stats.change(instance.author_id, posts=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        stats.change(instance.author_id, comments=1)
+        stats.change_comments_count(instance.post_id, 1)
+    else:
+        stats.change_comments_count(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    stats.change(instance.author_id, comments=-1)
+    stats.change_comments_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        stats.change(instance.user_id, following=1)
+        stats.change(instance.author_id, followers=1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    stats.change(instance.user_id, following=-1)
+    stats.change(instance.author_id, followers=-1)
+
+
+# Раскладка проверяет число подписчиков, поэтому подключена после счетчиков:
+# получатели вызываются в порядке регистрации.
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance.user, instance.author)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    search.index_posts(Post.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.remove_post(instance.pk)
+
+
+@receiver(pre_save, sender=Group)
+def remember_title(sender, instance, update_fields, **kwargs):
+    instance.previous_title = None
+    if instance.pk is None or (
+        update_fields is not None and 'title' not in update_fields
+    ):
+        return
+    instance.previous_title = Group.objects.filter(
+        pk=instance.pk
+    ).values_list('title', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+def reindex_group(sender, instance, **kwargs):
+    # Название группы входит в документы ее постов.
+    previous = getattr(instance, 'previous_title', None)
+    if previous is not None and previous != instance.title:
+        search.index_posts(instance.posts.all())
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_posts(sender, instance, **kwargs):
+    instance.post_ids = list(instance.posts.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Group)
+def reindex_group_posts(sender, instance, **kwargs):
+    search.index_posts(Post.objects.filter(pk__in=instance.post_ids))
+
+
+@receiver(post_save, sender=User)
+def reindex_author(sender, instance, **kwargs):
+    if profile_changed(instance):
+        search.index_posts(instance.posts.all())
@@ -0,0 +1,65 @@
+"""Денормализованные счетчики профиля и поста.
+
+Счетчики меняются атомарно через ``F()``, поэтому параллельные записи
+не теряют обновлений. Расхождения исправляет команда
+``manage.py reconcile_stats``.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import Comment, Follow, Post, User, UserStats
+
+
+def change(user_id, **deltas):
+    UserStats.objects.filter(user_id=user_id).update(**{
+        field: Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    })
+
+
+def change_comments_count(post_id, delta=0):
+    """Меняет счетчик комментариев поста и отмечает дату их изменения:
+    по ней страница поста отвечает на условные запросы."""
+    Post.objects.filter(pk=post_id).update(
+        comments_count=Greatest(F('comments_count') + delta, 0),
+        commented_at=timezone.now()
+    )
+
+
+def count_of(queryset, field):
+    """Подзапрос с числом строк queryset для внешнего ключа field."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+                field
+            ).annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def reconcile():
+    """Пересчитывает расходящиеся счетчики, возвращает число исправлений."""
+    actual = {
+        'posts': count_of(Post.objects.all(), 'author'),
+        'followers': count_of(Follow.objects.all(), 'author'),
+        'following': count_of(Follow.objects.all(), 'user'),
+        'comments': count_of(Comment.objects.all(), 'author'),
+    }
+    missing = User.objects.filter(stats__isnull=True)
+    fixed = missing.count()
+    UserStats.objects.bulk_create(
+        UserStats(user=user) for user in missing.iterator()
+    )
+    for field, expression in actual.items():
+        fixed += UserStats.objects.annotate(
+            actual=expression
+        ).exclude(**{field: F('actual')}).update(**{field: expression})
+    fixed += Post.objects.annotate(
+        actual=count_of(Comment.objects.all(), 'post')
+    ).exclude(comments_count=F('actual')).update(
+        comments_count=count_of(Comment.objects.all(), 'post')
+    )
+    return fixed
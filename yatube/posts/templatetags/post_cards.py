@@ -0,0 +1,12 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts import cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts, hide_group=False):
+    """Закэшированные карточки постов страницы."""
+    return [mark_safe(card) for card in cards.render(posts, hide_group)]
@@ -0,0 +1,18 @@
+from django import template
+from django.conf import settings
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(image, preset):
+    """Картинка поста с вариантами разной ширины и формата."""
+    sources = thumbnails.sources(image, preset)
+    return {
+        'image': thumbnails.lookup(image, preset),
+        'sources': [(type_, srcset) for type_, srcset in sources if type_],
+        'srcset': dict(sources).get(None),
+        'sizes': settings.POSTS_IMAGE_SIZES,
+    }
@@ -0,0 +1,65 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import TestCase
+
+from .. import search
+from ..models import Comment, Follow, Group, Post, TimelineEntry, User
+
+
+class SeedBenchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command(
+            'seed', users=20, groups=3, posts=60, comments=40, follows=50,
+            seed=1, stdout=StringIO()
+        )
+
+    def test_seed(self):
+        """seed вставляет строки и пересчитывает производные таблицы."""
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 40)
+        self.assertTrue(Follow.objects.exists())
+        self.assertEqual(
+            User.objects.aggregate(total=Sum('stats__posts'))['total'], 60
+        )
+        self.assertEqual(
+            Post.objects.aggregate(total=Sum('comments_count'))['total'], 40
+        )
+        expected = sum(
+            follow.author.posts.count() for follow in Follow.objects.all()
+        )
+        self.assertEqual(TimelineEntry.objects.count(), expected)
+        post = Post.objects.first()
+        self.assertIn(post.pk, search.search_ids(post.text))
+        self.assertTrue(Post._meta.get_field('pub_date').auto_now_add)
+        # Новые посты получают свободные id после вставки с явными id.
+        Post.objects.create(author=post.author, text='Новый пост')
+
+    def test_bench(self):
+        """bench выводит JSON с замерами всех страниц."""
+        out = StringIO()
+        call_command('bench', repeat=2, stdout=out)
+        views = json.loads(out.getvalue())['views']
+        self.assertEqual(set(views), {
+            'index', 'group_posts', 'profile', 'post_detail', 'follow_index'
+        })
+        for name, result in views.items():
+            with self.subTest(view=name):
+                self.assertEqual(result['status'], 200)
+                self.assertGreater(result['bytes'], 0)
+                self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+
+    def test_bench_suites(self):
+        """Замеры выбираются аргументами и выводятся одним JSON."""
+        out = StringIO()
+        call_command('bench', 'cache', 'compression', repeat=1, stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertNotIn('views', result)
+        self.assertIn('locmem', result['cache'])
+        self.assertIn('identity', result['compression']['index'])
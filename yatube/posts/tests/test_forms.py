@@ -1,12 +1,15 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django import forms
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
+from .. import thumbnails
 from ..models import Comment, Group, Post, User
 
 
@@ -31,9 +34,22 @@ SMALL_GIF = (
     b'\x0A\x00\x3B'
 )
 IMAGE_FOLDER = 'posts/'
+EXIF_ORIENTATION = 0x0112
+ROTATED_90 = 6
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+def rotated_jpeg():
+    """JPEG 4x2, который по EXIF нужно повернуть на 90 градусов."""
+    buffer = BytesIO()
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = ROTATED_90
+    Image.new('RGB', (4, 2)).save(buffer, 'JPEG', exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_THUMBNAIL_PIPELINE='sync'
+)
 class PostFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -68,6 +84,8 @@ class PostFormTests(TestCase):
     @classmethod
     def tearDownClass(cls):
         super().tearDownClass()
+        # Пул потоков не должен писать в каталог во время удаления.
+        thumbnails.wait()
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def test_create_post_form(self):
@@ -230,3 +248,44 @@ class PostFormTests(TestCase):
             follow=True,
         )
         self.assertEqual(comment.count(), 0)
+
+    def test_image_limits(self):
+        """Слишком большие файл или картинка отвергаются с ошибкой
+        формы, пост не создается."""
+        limits = [
+            {'POSTS_IMAGE_MAX_BYTES': len(SMALL_GIF) - 1},
+            {'POSTS_IMAGE_MAX_PIXELS': 1},
+            {'POSTS_IMAGE_MAX_SIDE': 1},
+        ]
+        count = Post.objects.count()
+        for limit in limits:
+            with self.subTest(limit=limit), override_settings(**limit):
+                uploaded = SimpleUploadedFile(
+                    name='large.gif',
+                    content=SMALL_GIF,
+                    content_type='image/gif'
+                )
+                response = self.author.post(
+                    POST_CREATE_URL,
+                    data={'text': 'test_text', 'image': uploaded},
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.context['form'].has_error('image'))
+                self.assertEqual(Post.objects.count(), count)
+
+    def test_image_orientation_is_normalized(self):
+        """Картинка поворачивается по EXIF и сохраняется без EXIF."""
+        uploaded = SimpleUploadedFile(
+            name='rotated.jpg',
+            content=rotated_jpeg(),
+            content_type='image/jpeg'
+        )
+        self.author.post(
+            POST_CREATE_URL,
+            data={'text': 'test_text', 'image': uploaded},
+        )
+        post = Post.objects.exclude(pk=self.post.id).get()
+        self.assertEqual(post.image.name, f'{IMAGE_FOLDER}rotated.jpg')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (2, 4))
+            self.assertFalse(image.getexif())
@@ -1,6 +1,9 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
 
-from ..models import Group, Post, User
+from ..models import Comment, Follow, Group, Post, User, UserStats
 
 
 class PostModelTest(TestCase):
@@ -34,3 +37,62 @@ class PostModelTest(TestCase):
 
     def test_models_have_correct_object_str(self):
         self.assertEqual(self.post.text[:15], str(self.post))
+
+    def test_text_is_rendered_on_write(self):
+        """HTML и заголовок вычисляются при любой записи текста."""
+        text = '<b>Первая строка</b>\nвторая строка длиннее тридцати символов'
+        html = '&lt;b&gt;Первая строка&lt;/b&gt;<br>вторая'
+        post = Post.objects.create(author=self.user, text=text)
+        self.assertTrue(post.text_html.startswith(html))
+        self.assertEqual(len(post.title), 30)
+        post.text = 'правка'
+        post.save(update_fields=['text'])
+        post.refresh_from_db()
+        self.assertEqual((post.text_html, post.title), ('правка', 'правка'))
+        Post.objects.filter(pk=post.pk).update(text='a\nb')
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, 'a<br>b')
+        Post.objects.bulk_create([Post(author=self.user, text='x\ny')])
+        self.assertTrue(Post.objects.filter(text_html='x<br>y').exists())
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='<i>\n'
+        )
+        self.assertEqual(comment.text_html, '&lt;i&gt;<br>')
+
+
+class StatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Author')
+        cls.user_2 = User.objects.create_user(username='User_2')
+
+    def test_counters_follow_changes(self):
+        """Счетчики профиля и поста меняются вместе с данными."""
+        post = Post.objects.create(author=self.user, text='test_text')
+        Comment.objects.create(post=post, author=self.user_2, text='text')
+        Follow.objects.create(user=self.user_2, author=self.user)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        data = (
+            (self.user, dict(posts=1, followers=1, following=0, comments=0)),
+            (self.user_2, dict(posts=0, followers=0, following=1, comments=1)),
+        )
+        for user, expected in data:
+            with self.subTest(user=user):
+                stats = UserStats.objects.get(user=user)
+                for field, value in expected.items():
+                    self.assertEqual(getattr(stats, field), value)
+        post.delete()
+        stats = UserStats.objects.get(user=self.user_2)
+        self.assertEqual(stats.comments, 0)
+
+    def test_reconcile_stats_repairs_drift(self):
+        """Команда reconcile_stats исправляет разошедшиеся счетчики."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text='test_text') for _ in range(3)
+        )
+        UserStats.objects.filter(user=self.user_2).delete()
+        call_command('reconcile_stats', stdout=StringIO())
+        self.assertEqual(UserStats.objects.get(user=self.user).posts, 3)
+        self.assertTrue(UserStats.objects.filter(user=self.user_2).exists())
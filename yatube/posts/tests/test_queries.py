@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Follow, Group, Post, User
+
+USERNAME = 'Author'
+USERNAME_2 = 'User_2'
+SLUG = 'slug'
+INDEX_URL = reverse('posts:index')
+GROUP_URL = reverse('posts:group_list', args=[SLUG])
+PROFILE_URL = reverse('posts:profile', args=[USERNAME])
+FOLLOW_URL = reverse('posts:follow_index')
+# Предельное число запросов на страницу, включая сессию и пользователя.
+QUERY_BUDGET = {
+    INDEX_URL: 3,
+    GROUP_URL: 4,
+    PROFILE_URL: 5,
+    FOLLOW_URL: 4,
+}
+
+
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(
+            username=USERNAME, first_name='Имя', last_name='Фамилия'
+        )
+        cls.user_2 = User.objects.create(username=USERNAME_2)
+        cls.client_2 = Client()
+        cls.client_2.force_login(cls.user_2)
+        cls.group = Group.objects.create(
+            title='test_title',
+            slug=SLUG,
+            description='test_desc',
+        )
+        Follow.objects.create(user=cls.user_2, author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.client_2.get(url)
+        return len(context.captured_queries)
+
+    def create_posts(self, count):
+        for number in range(count):
+            Post.objects.create(
+                text=f'Пост №{number}', author=self.user, group=self.group
+            )
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        """Число запросов ленты не зависит от числа постов на странице
+        и укладывается в бюджет.
+        """
+        self.create_posts(1)
+        single = {url: self.count_queries(url) for url in QUERY_BUDGET}
+        self.create_posts(settings.POSTS * 2)
+        for url, budget in QUERY_BUDGET.items():
+            with self.subTest(url=url):
+                queries = self.count_queries(url)
+                self.assertEqual(queries, single[url])
+                self.assertLessEqual(queries, budget)
+
+    def test_cached_listing_skips_post_queries(self):
+        """Повторный запрос закэшированной ленты не читает посты."""
+        self.create_posts(settings.POSTS)
+        self.client_2.get(INDEX_URL)
+        with CaptureQueriesContext(connection) as context:
+            self.client_2.get(INDEX_URL)
+        self.assertFalse([
+            query for query in context.captured_queries
+            if 'posts_post' in query['sql']
+        ])
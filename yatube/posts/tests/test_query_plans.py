@@ -0,0 +1,97 @@
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import timeline
+from ..models import Comment, Follow, Group, Post, User
+
+USERNAME = 'Author'
+USERNAME_2 = 'User_2'
+SLUG = 'slug'
+INDEX_URL = reverse('posts:index')
+GROUP_URL = reverse('posts:group_list', args=[SLUG])
+PROFILE_URL = reverse('posts:profile', args=[USERNAME])
+FOLLOW_URL = reverse('posts:follow_index')
+# Признаки плана, при которых запрос не масштабируется с ростом таблиц.
+BAD_PLANS = ('USE TEMP B-TREE',)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN есть в SQLite')
+class QueryPlanTest(TestCase):
+    """Горячие запросы идут по индексам, без полного просмотра таблиц
+    и без сортировки во временном B-дереве.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username=USERNAME)
+        cls.user_2 = User.objects.create(username=USERNAME_2)
+        cls.client_2 = Client()
+        cls.client_2.force_login(cls.user_2)
+        cls.group = Group.objects.create(
+            title='test_title',
+            slug=SLUG,
+            description='test_desc',
+        )
+        Follow.objects.create(user=cls.user_2, author=cls.user)
+        for number in range(settings.POSTS + 1):
+            Post.objects.create(
+                text=f'Пост №{number}', author=cls.user, group=cls.group
+            )
+        cls.post = Post.objects.first()
+        for number in range(settings.COMMENTS + 1):
+            Comment.objects.create(
+                post=cls.post, author=cls.user_2, text=f'Комментарий №{number}'
+            )
+
+    def explain(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertUsesIndexes(self, sql, params=()):
+        for step in self.explain(sql, params):
+            full_scan = step.startswith('SCAN ') and ' USING ' not in step
+            self.assertFalse(
+                full_scan or step.startswith(BAD_PLANS),
+                f'{step}\n{sql}'
+            )
+
+    def test_querysets(self):
+        """Выборки по внешнему ключу с сортировкой по дате."""
+        querysets = {
+            'group.posts': self.group.posts.all(),
+            'author.posts': self.user.posts.all(),
+            'post.comments': self.post.comments.all(),
+            'followers': timeline.followers(self.user),
+        }
+        for name, queryset in querysets.items():
+            with self.subTest(queryset=name):
+                self.assertUsesIndexes(*queryset.query.sql_with_params())
+
+    def test_pages(self):
+        """Все запросы лент и страницы поста, включая следующие страницы."""
+        post_detail_url = reverse('posts:post_detail', args=[self.post.pk])
+        comments_url = reverse('posts:post_comments', args=[self.post.pk])
+        urls = [INDEX_URL, GROUP_URL, PROFILE_URL, post_detail_url]
+        cursor = self.client_2.get(INDEX_URL).context['page_obj'].next_cursor
+        urls += [f'{url}?cursor={cursor}' for url in urls[:3]]
+        feed_cursor = self.client_2.get(
+            FOLLOW_URL
+        ).context['page_obj'].next_cursor
+        urls += [FOLLOW_URL, f'{FOLLOW_URL}?cursor={feed_cursor}']
+        urls.append(comments_url)
+        for url in urls:
+            cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                self.client_2.get(url)
+            for query in context.captured_queries:
+                if query['sql'].startswith('SELECT'):
+                    with self.subTest(url=url, sql=query['sql']):
+                        self.assertUsesIndexes(query['sql'])
@@ -9,12 +9,14 @@ POST_ID = 1
 ROUTES = [
     ['/', 'index', []],
     ['/create/', 'post_create', []],
+    ['/search/', 'search', []],
     ['/follow/', 'follow_index', []],
     [f'/group/{SLUG}/', 'group_list', [SLUG]],
     [f'/profile/{USERNAME}/', 'profile', [USERNAME]],
     [f'/posts/{POST_ID}/', 'post_detail', [POST_ID]],
     [f'/posts/{POST_ID}/edit/', 'post_edit', [POST_ID]],
     [f'/posts/{POST_ID}/comment/', 'add_comment', [POST_ID]],
+    [f'/posts/{POST_ID}/comments/', 'post_comments', [POST_ID]],
     [f'/profile/{USERNAME}/follow/', 'profile_follow', [USERNAME]],
     [f'/profile/{USERNAME}/unfollow/', 'profile_unfollow', [USERNAME]]
 ]
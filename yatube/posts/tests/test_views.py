@@ -1,13 +1,28 @@
+import base64
 import shutil
 import tempfile
+import time
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.test import Client, RequestFactory, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 
-from ..models import Follow, Group, Post, User
+from core import tiered
+from core import cache as core_cache
+from core.cache import versions
+
+from .. import cards, search, thumbnails, timeline, views
+from ..models import (
+    Comment, Follow, Group, Post, TimelineEntry, User, UserStats
+)
+from ..paginator import ELLIPSIS, CursorPaginator
 
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -79,6 +94,8 @@ class PostsPagesTests(TestCase):
     @classmethod
     def tearDownClass(cls):
         super().tearDownClass()
+        # Пул потоков не должен писать в каталог во время удаления.
+        thumbnails.wait()
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def test_post_in_url_show_correct_context(self):
@@ -153,16 +170,259 @@ class PostsPagesTests(TestCase):
             user=self.user_2, author=self.user_3).exists()
         )
 
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост автора попадает в материализованную ленту
+        подписчика, а после отписки удаляется из нее.
+        """
+        post = Post.objects.create(author=self.user, text='fan_out')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user_2, post=post).exists()
+        )
+        self.assertIn(post, self.another_user.get(FOLLOW_URL).context[
+            'page_obj'
+        ])
+        Follow.objects.filter(user=self.user_2, author=self.user).delete()
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.user_2).exists()
+        )
+
+    @override_settings(FANOUT_LIMIT=0)
+    def test_celebrity_posts_merged_on_read(self):
+        """Посты авторов с большим числом подписчиков не раскладываются
+        по лентам, но подмешиваются в ленту при чтении.
+        """
+        post = Post.objects.create(author=self.user, text='celebrity')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertIn(post, self.another_user.get(FOLLOW_URL).context[
+            'page_obj'
+        ])
+
+    @override_settings(FANOUT_LIMIT=1)
+    def test_celebrity_posts_stay_after_followers_drop(self):
+        """Посты, не разложенные по лентам, не пропадают из ленты,
+        когда подписчиков у автора становится меньше предела.
+        """
+        Follow.objects.create(user=self.user_3, author=self.user)
+        post = Post.objects.create(author=self.user, text='celebrity')
+        Follow.objects.filter(user=self.user_3, author=self.user).delete()
+        self.assertIn(post, self.another_user.get(FOLLOW_URL).context[
+            'page_obj'
+        ])
+        timeline.rebuild()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user_2, post=post).exists()
+        )
+        self.assertIn(post, self.another_user.get(FOLLOW_URL).context[
+            'page_obj'
+        ])
+
+    @override_settings(FANOUT_LIMIT=1)
+    def test_follow_counted_before_backfill(self):
+        """Подписка, переводящая автора за предел, уже учтена, когда
+        его посты раскладываются в ленту нового подписчика.
+        """
+        Follow.objects.create(user=self.user_3, author=self.user)
+        self.assertTrue(UserStats.objects.get(user=self.user).celebrity)
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.user_3).exists()
+        )
+
+    @override_settings(FANOUT_LIMIT=1)
+    def test_rebuild_timeline_command_demotes_author(self):
+        """Команда снимает флаг знаменитости с автора и раскладывает его
+        посты; полная перестройка учитывает авторов без счетчиков.
+        """
+        Follow.objects.create(user=self.user_3, author=self.user)
+        post = Post.objects.create(author=self.user, text='celebrity')
+        Follow.objects.filter(user=self.user_3, author=self.user).delete()
+        call_command(
+            'rebuild_timeline', self.user.username, stdout=StringIO()
+        )
+        self.assertFalse(UserStats.objects.get(user=self.user).celebrity)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user_2, post=post).exists()
+        )
+        UserStats.objects.filter(user=self.user).delete()
+        call_command('rebuild_timeline', stdout=StringIO())
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user_2, post=post).exists()
+        )
+
+    @override_settings(POSTS_THUMBNAIL_PIPELINE='sync')
+    def test_thumbnail_is_not_rendered_on_request(self):
+        """Страница выводит заглушку, пока миниатюру не создал
+        фоновый обработчик, и готовую миниатюру после него.
+        """
+        self.addCleanup(cache.clear)
+        response = self.author.get(self.POST_DETAIL_URL)
+        self.assertContains(response, settings.POSTS_THUMBNAIL_PLACEHOLDER)
+        thumbnails.submit(self.post.image.name, 'card')
+        thumbnail = thumbnails.lookup(self.post.image, 'card')
+        self.assertNotIsInstance(thumbnail, thumbnails.Placeholder)
+        self.assertContains(
+            self.author.get(self.POST_DETAIL_URL), thumbnail.url
+        )
+
+    @override_settings(POSTS_THUMBNAIL_PIPELINE='sync')
+    def test_ready_thumbnail_invalidates_pages(self):
+        """Готовая миниатюра сбрасывает кэш страниц с заглушкой."""
+        self.addCleanup(cache.clear)
+        stale = versions('index', f'profile:{self.user.pk}')
+        thumbnails.submit(self.post.image.name, 'card')
+        self.assertNotEqual(
+            versions('index', f'profile:{self.user.pk}'), stale
+        )
+
+    @override_settings(POSTS_THUMBNAIL_PIPELINE='sync')
+    def test_images_ready_at(self):
+        """Дата готовности записывается, когда готовы все пресеты,
+        и сбрасывается сменой картинки."""
+        self.addCleanup(cache.clear)
+        presets = list(settings.POSTS_THUMBNAIL_PRESETS)
+        for preset in presets:
+            post = Post.objects.get(pk=self.post.pk)
+            self.assertIsNone(post.images_ready_at)
+            thumbnails.submit(post.image.name, preset)
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertIsNotNone(post.images_ready_at)
+        post.text = 'edited_text'
+        post.save()
+        self.assertIsNotNone(post.images_ready_at)
+        post.image = 'posts/other.gif'
+        post.save()
+        self.assertIsNone(
+            Post.objects.get(pk=self.post.pk).images_ready_at
+        )
+
+    @override_settings(POSTS_THUMBNAIL_PIPELINE='sync')
+    def test_failed_thumbnail_is_not_retried(self):
+        """Неудавшаяся миниатюра не ставится в очередь на каждом
+        просмотре."""
+        self.addCleanup(cache.clear)
+        with mock.patch.object(
+            thumbnails.backend, 'get_thumbnail', side_effect=OSError
+        ) as get_thumbnail, self.assertLogs('posts.thumbnails'):
+            for _ in range(2):
+                thumbnails.submit(self.post.image.name, 'card')
+        self.assertEqual(get_thumbnail.call_count, 1)
+
+    def test_wait_for_thumbnail_pool(self):
+        """wait() возвращается, когда пул дописал заказанные миниатюры."""
+        with mock.patch.object(
+            thumbnails.backend, 'get_thumbnail',
+            side_effect=lambda *args, **kwargs: time.sleep(0.01)
+        ) as get_thumbnail:
+            thumbnails.submit('wait.gif', 'card')
+            thumbnails.wait()
+            self.assertEqual(
+                get_thumbnail.call_count,
+                len(list(thumbnails.variants('card')))
+            )
+
+    @override_settings(POSTS_THUMBNAIL_PIPELINE='sync')
+    def test_responsive_variants(self):
+        """Картинка выводится со srcset из вариантов разной ширины
+        и в современных форматах, поддерживаемых Pillow.
+        """
+        self.addCleanup(cache.clear)
+        thumbnails.submit(self.post.image.name, 'card')
+        sources = dict(thumbnails.sources(self.post.image, 'card'))
+        self.assertIn(None, sources)
+        for format_ in thumbnails.formats():
+            self.assertIn(f'image/{format_.lower()}', sources)
+        response = self.author.get(self.POST_DETAIL_URL)
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, settings.POSTS_IMAGE_SIZES)
+        for type_, srcset in sources.items():
+            with self.subTest(type=type_):
+                self.assertContains(response, srcset)
+
+    def test_search(self):
+        """Поиск находит посты по тексту, группе и автору,
+        подсвечивает совпадения и забывает удаленные посты.
+        """
+        post = Post.objects.create(
+            author=self.user, text='Уникальный <b>текст</b>', group=self.group
+        )
+        search_url = reverse('posts:search')
+        queries = ['уникальный', 'Уник', self.group.title, USERNAME]
+        for query in queries:
+            with self.subTest(query=query):
+                response = self.author.get(search_url, {'q': query})
+                self.assertIn(post, response.context['page_obj'])
+        response = self.author.get(search_url, {'q': 'уникальный'})
+        self.assertContains(response, '<mark>Уникальный</mark>')
+        self.assertContains(response, '&lt;b&gt;')
+        post.delete()
+        response = self.author.get(search_url, {'q': 'уникальный'})
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_group_reindexed_on_title_change(self):
+        """Посты группы переиндексируются только при смене названия."""
+        group = Group.objects.get(pk=self.group.pk)
+        with mock.patch.object(search, 'index_posts') as index_posts:
+            group.description = 'new_desc'
+            group.save()
+            index_posts.assert_not_called()
+            group.title = 'new_title'
+            group.save()
+        index_posts.assert_called_once()
+
+    def test_search_ignores_broken_cursor(self):
+        """Поддельный курсор поиска открывает первую страницу."""
+        post = Post.objects.create(author=self.user, text='Уникальный')
+        for data in ('[1.0, 1, "x"]', '[1.0, 1, null]', 'null'):
+            with self.subTest(data=data):
+                cursor = base64.urlsafe_b64encode(data.encode()).decode()
+                response = self.author.get(
+                    reverse('posts:search'),
+                    {'q': 'уникальный', 'cursor': cursor}
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(post, response.context['page_obj'])
+
     def test_cache(self):
         """Проверка кэширования главной страницы."""
         response = self.author.get(INDEX_URL).content
-        Post.objects.all().delete()
+        # update() не отправляет сигналы и не сбрасывает версию кэша.
+        Post.objects.all().update(text='changed_text')
         response_cache = self.author.get(INDEX_URL).content
         self.assertEqual(response, response_cache)
         cache.clear()
         response_clear = self.author.get(INDEX_URL).content
         self.assertNotEqual(response, response_clear)
 
+    def test_feeds_with_equal_versions(self):
+        """Ленты с совпавшими версиями областей не делят кэш."""
+        self.addCleanup(cache.clear)
+        other = User.objects.create(username='other_author')
+        Post.objects.create(author=other, text='other_text')
+        version = versions('index')
+        cache.set(f'version:profile:{self.user.pk}', int(version), None)
+        self.assertContains(self.author.get(INDEX_URL), 'other_text')
+        self.assertNotContains(self.author.get(PROFILE_URL), 'other_text')
+
+    def test_cache_invalidated_on_changes(self):
+        """Кэш лент сбрасывается при изменении постов и групп."""
+        self.addCleanup(cache.clear)
+        urls = [INDEX_URL, GROUP_URL, PROFILE_URL]
+        for url in urls:
+            self.author.get(url)
+        Post.objects.create(
+            author=self.user, text='new_text', group=self.group
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.author.get(url), 'new_text')
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'new_title'
+        group.save()
+        self.assertContains(self.author.get(INDEX_URL), 'new_title')
+        Post.objects.all().delete()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotContains(self.author.get(url), 'new_text')
+
 
 class PaginatorViewsTest(TestCase):
     @classmethod
@@ -198,6 +458,39 @@ class PaginatorViewsTest(TestCase):
             author=cls.user,
         )
 
+    def test_unknown_parameters_stay_out_of_cached_links(self):
+        """Посторонние параметры запроса не попадают в ссылки
+        закэшированной страницы."""
+        self.addCleanup(cache.clear)
+        cache.clear()
+        self.assertNotContains(
+            Client().get(INDEX_URL, {'evil': 'injected'}), 'injected'
+        )
+        self.assertNotContains(Client().get(INDEX_URL), 'injected')
+
+    def test_garbage_parameters_share_cache_key(self):
+        """Неверные параметры страницы не создают новых ключей кэша,
+        а длина ключа не зависит от адреса."""
+        factory = RequestFactory()
+
+        def key(query):
+            request = factory.get(INDEX_URL, query)
+            request.user = self.user
+            return views.get_cache_key(request, 'index')
+
+        first = key({})
+        for query in (
+            {'cursor': 'garbage'},
+            {'cursor': 'x' * 1000},
+            {'date': '2021-13-45'},
+            {'date': 'garbage'},
+        ):
+            with self.subTest(query=query):
+                self.assertEqual(key(query), first)
+        self.assertEqual(key({'page': 'garbage'}), key({'page': '1'}))
+        self.assertEqual(key({'page': '02'}), key({'page': '2'}))
+        self.assertEqual(len(key({'page': '9' * 1000})), len(first))
+
     def test_pagination_first_and_second_pages(self):
         """Проверка пагинации для первой и второй страниц."""
         page_test_value = Post.objects.all().count() - settings.POSTS
@@ -221,3 +514,459 @@ class PaginatorViewsTest(TestCase):
                     len(client.get(url).context['page_obj']),
                     page_count
                 )
+
+    def test_comments_are_paginated(self):
+        """Комментарии выводятся порциями, более ранние
+        подгружаются отдельным запросом.
+        """
+        post = Post.objects.first()
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.user_2, text=f'Комментарий {count}')
+            for count in range(settings.COMMENTS + PAGINATOR_PAGE_COUNT_RANGE)
+        )
+        url = reverse('posts:post_detail', args=[post.id])
+        comments = self.author.get(url).context['comments']
+        self.assertEqual(len(comments), settings.COMMENTS)
+        response = self.author.get(
+            reverse('posts:post_comments', args=[post.id]),
+            {'cursor': comments.next_cursor}
+        ).json()
+        self.assertIsNone(response['next_cursor'])
+        self.assertEqual(
+            response['html'].count('media-body'), PAGINATOR_PAGE_COUNT_RANGE
+        )
+
+    def test_cursor_pagination(self):
+        """Переход по курсорам вперед и назад на всех лентах."""
+        page_test_value = Post.objects.all().count() - settings.POSTS
+        data = (
+            (self.author, INDEX_URL),
+            (self.author, GROUP_URL),
+            (self.author, PROFILE_URL),
+            (self.another_user, FOLLOW_URL),
+        )
+        for client, url in data:
+            with self.subTest(url=url):
+                cache.clear()
+                first = client.get(url).context['page_obj']
+                self.assertEqual(len(first), settings.POSTS)
+                self.assertIsNone(first.previous_cursor)
+                second = client.get(
+                    url, {'cursor': first.next_cursor}
+                ).context['page_obj']
+                self.assertEqual(len(second), page_test_value)
+                self.assertEqual(second.number, 2)
+                self.assertIsNone(second.next_cursor)
+                self.assertFalse(set(first) & set(second))
+                back = client.get(
+                    url, {'cursor': second.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(back), list(first))
+                self.assertIsNone(back.previous_cursor)
+
+    def test_invalid_cursor_shows_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        page = self.author.get(
+            INDEX_URL, {'cursor': 'broken'}
+        ).context['page_obj']
+        self.assertEqual(page.number, 1)
+        self.assertEqual(len(page), settings.POSTS)
+
+    def test_page_window_is_bounded(self):
+        """Навигация выводит окно номеров с пропусками."""
+        paginator = CursorPaginator(Post.objects.all(), 1)
+        self.assertEqual(
+            list(paginator.elided_page_range(7, on_each_side=1, on_ends=1)),
+            [1, ELLIPSIS, 6, 7, 8, ELLIPSIS, paginator.num_pages]
+        )
+        self.assertEqual(
+            list(paginator.elided_page_range(1)),
+            [1, 2, 3, 4, ELLIPSIS, *range(paginator.num_pages - 1,
+                                          paginator.num_pages + 1)]
+        )
+        with override_settings(
+            POSTS=1, PAGINATOR_ON_EACH_SIDE=1, PAGINATOR_ON_ENDS=1
+        ):
+            cache.clear()
+            response = self.author.get(INDEX_URL, {'page': 7})
+        self.assertEqual(len(response.context['page_obj'].page_window), 7)
+        # Четыре номера и ссылки на первую, предыдущую, следующую
+        # и последнюю страницы.
+        self.assertEqual(response.content.decode().count('page='), 8)
+
+    def test_jump_to_date(self):
+        """Переход к дате открывает посты, опубликованные не позже нее."""
+        older = Post.objects.order_by('pub_date').values_list('pk', flat=True)
+        Post.objects.filter(
+            pk__in=list(older[:PAGINATOR_PAGE_COUNT_RANGE])
+        ).update(pub_date=datetime(2020, 1, 1, 12, tzinfo=timezone.utc))
+        page = self.author.get(
+            INDEX_URL, {'date': '2020-01-01'}
+        ).context['page_obj']
+        self.assertEqual(len(page), PAGINATOR_PAGE_COUNT_RANGE)
+        self.assertEqual(page.number, 0)
+        self.assertIsNotNone(page.previous_cursor)
+        newer = self.author.get(
+            INDEX_URL, {'cursor': page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(newer), settings.POSTS)
+        self.assertFalse(set(page) & set(newer))
+        today = {'date': timezone.localdate().isoformat()}
+        response = self.author.get(INDEX_URL, today)
+        self.assertNotIn('date=', response.content.decode())
+        page = response.context['page_obj']
+        self.assertIsNotNone(page.next_cursor)
+        following = self.author.get(
+            INDEX_URL, {**today, 'cursor': page.next_cursor}
+        ).context['page_obj']
+        self.assertTrue(following)
+        self.assertFalse(set(page) & set(following))
+        for date in ('broken', '9999-12-31'):
+            with self.subTest(date=date):
+                page = self.author.get(
+                    INDEX_URL, {'date': date}
+                ).context['page_obj']
+                self.assertEqual(page.number, 1)
+
+
+@override_settings(CACHE_SHARED=True)
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username=USERNAME)
+        cls.author = Client()
+        cls.author.force_login(cls.user)
+        cls.user_2 = User.objects.create(username=USERNAME_2)
+        cls.another_user = Client()
+        cls.another_user.force_login(cls.user_2)
+        cls.group = Group.objects.create(
+            title='test_title',
+            slug=SLUG,
+            description='test_desc',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='test_text', group=cls.group
+        )
+        cls.POST_DETAIL_URL = reverse('posts:post_detail', args=[cls.post.id])
+        cls.urls = [INDEX_URL, GROUP_URL, PROFILE_URL, cls.POST_DETAIL_URL]
+
+    def setUp(self):
+        cache.clear()
+
+    def revalidate(self, client, url, response):
+        return client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_not_modified(self):
+        """Повторный запрос без изменений получает 304 без рендера."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.author.get(url)
+                self.assertEqual(response.status_code, 200)
+                repeated = self.revalidate(self.author, url, response)
+                self.assertEqual(repeated.status_code, 304)
+                self.assertFalse(repeated.content)
+                self.assertEqual(repeated.templates, [])
+
+    def test_changes_update_validator(self):
+        """Правка поста меняет валидатор всех страниц с ним."""
+        responses = {url: self.author.get(url) for url in self.urls}
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'edited_text'
+        post.save()
+        for url, response in responses.items():
+            with self.subTest(url=url):
+                changed = self.revalidate(self.author, url, response)
+                self.assertContains(changed, 'edited_text')
+
+    def test_new_comment_updates_post_detail(self):
+        response = self.author.get(self.POST_DETAIL_URL)
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(
+            self.author.get(
+                self.POST_DETAIL_URL,
+                HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+            ).status_code,
+            304
+        )
+        Comment.objects.create(
+            post=self.post, author=self.user_2, text='new_comment'
+        )
+        self.assertContains(
+            self.revalidate(self.author, self.POST_DETAIL_URL, response),
+            'new_comment'
+        )
+
+    def test_edited_comment_updates_post_detail(self):
+        comment = Comment.objects.create(
+            post=self.post, author=self.user_2, text='new_comment'
+        )
+        response = self.author.get(self.POST_DETAIL_URL)
+        comment.text = 'edited_comment'
+        comment.save()
+        self.assertContains(
+            self.revalidate(self.author, self.POST_DETAIL_URL, response),
+            'edited_comment'
+        )
+
+    def test_ready_thumbnails_update_post_detail(self):
+        """Страница с исходником картинки обновляется, когда готовы
+        ее варианты; готовность читается из строки поста."""
+        with mock.patch.object(thumbnails, 'ready') as ready:
+            response = self.author.get(self.POST_DETAIL_URL)
+            ready.assert_not_called()
+        Post.objects.filter(pk=self.post.pk).update(
+            images_ready_at=timezone.now() + timedelta(minutes=1)
+        )
+        self.assertEqual(
+            self.revalidate(
+                self.author, self.POST_DETAIL_URL, response
+            ).status_code,
+            200
+        )
+        self.assertEqual(
+            self.author.get(
+                self.POST_DETAIL_URL,
+                HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+            ).status_code,
+            200
+        )
+
+    def test_versions_update_last_modified(self):
+        """Last-Modified учитывает версии областей, как и ETag."""
+        response = self.author.get(self.POST_DETAIL_URL)
+        later = int((time.time() + 60) * 1000)
+        with mock.patch.object(core_cache, '_initial', return_value=later):
+            core_cache.bump(f'profile:{self.user.pk}')
+        self.assertEqual(
+            self.author.get(
+                self.POST_DETAIL_URL,
+                HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+            ).status_code,
+            200
+        )
+
+    @override_settings(CACHE_SHARED=False)
+    def test_no_validators_without_shared_cache(self):
+        """Без общего кэша воркер не узнает о чужих изменениях,
+        поэтому страницы не отвечают 304."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.author.get(url)
+                self.assertNotIn('ETag', response)
+                self.assertNotIn('Last-Modified', response)
+                self.assertEqual(
+                    self.author.get(
+                        url, HTTP_IF_NONE_MATCH='*'
+                    ).status_code,
+                    200
+                )
+
+    def test_validator_depends_on_user(self):
+        """Страница другого пользователя не считается актуальной."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.author.get(url)
+                self.assertEqual(
+                    self.revalidate(
+                        self.another_user, url, response
+                    ).status_code,
+                    200
+                )
+
+
+@override_settings(CACHE_SHARED=True)
+class EdgeCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username=USERNAME)
+        cls.author = Client()
+        cls.author.force_login(cls.user)
+        cls.group = Group.objects.create(
+            title='test_title',
+            slug=SLUG,
+            description='test_desc',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='test_text', group=cls.group
+        )
+        cls.POST_DETAIL_URL = reverse('posts:post_detail', args=[cls.post.id])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_pages_are_public(self):
+        """Анонимные страницы не трогают сессию и несут ключи данных."""
+        post_keys = {
+            f'post-{self.post.pk}',
+            f'author-{self.user.pk}',
+            f'group-{self.group.pk}',
+        }
+        pages = {
+            INDEX_URL: {'index', *post_keys},
+            GROUP_URL: post_keys,
+            PROFILE_URL: post_keys,
+            self.POST_DETAIL_URL: post_keys,
+        }
+        for url, keys in pages.items():
+            with self.subTest(url=url):
+                response = Client().get(url)
+                self.assertFalse(response.cookies)
+                self.assertNotIn('Cookie', response.get('Vary', ''))
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn(
+                    f's-maxage={settings.EDGE_CACHE_TIMEOUT}',
+                    response['Cache-Control']
+                )
+                self.assertEqual(
+                    set(response['Surrogate-Key'].split()), keys
+                )
+                repeated = Client().get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+                self.assertEqual(repeated.status_code, 304)
+                self.assertIn('public', repeated['Cache-Control'])
+
+    def test_pages_with_session_are_private(self):
+        for client in (self.author, Client(HTTP_COOKIE='sessionid=stale')):
+            with self.subTest(client=client):
+                response = client.get(INDEX_URL)
+                self.assertIn('private', response['Cache-Control'])
+                self.assertNotIn('Surrogate-Key', response)
+
+    @override_settings(EDGE_PURGE_URL='http://127.0.0.1:6081/')
+    def test_changes_purge_pages(self):
+        """Изменения моделей сбрасывают страницы с их ключами."""
+        with mock.patch(
+            'core.edge.transaction.on_commit', lambda func: func()
+        ), mock.patch('core.edge.send') as send:
+            post = Post.objects.get(pk=self.post.pk)
+            post.text = 'edited_text'
+            post.save()
+            Comment.objects.create(
+                post=self.post, author=self.user, text='text'
+            )
+            self.group.save()
+        purged = [set(call.args[0]) for call in send.call_args_list]
+        self.assertIn({
+            'index',
+            f'post-{self.post.pk}',
+            f'author-{self.user.pk}',
+            f'group-{self.group.pk}',
+        }, purged)
+        self.assertIn(
+            {f'post-{self.post.pk}', f'author-{self.user.pk}'}, purged
+        )
+        self.assertIn({f'group-{self.group.pk}'}, purged)
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username=USERNAME, first_name='Имя')
+        cls.author = Client()
+        cls.author.force_login(cls.user)
+        cls.group = Group.objects.create(
+            title='test_title',
+            slug=SLUG,
+            description='test_desc',
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Пост №{number}', author=cls.user, group=cls.group)
+            for number in range(settings.POSTS)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def listing(self):
+        return Post.objects.for_listing()[:settings.POSTS]
+
+    def test_cards_are_rendered_once(self):
+        """Карточки страницы читаются из кэша одним запросом к нему."""
+        with mock.patch.object(
+            cards, 'render_to_string', wraps=cards.render_to_string
+        ) as render:
+            first = cards.render(self.listing())
+            self.assertEqual(render.call_count, settings.POSTS)
+            with mock.patch.object(
+                tiered.cache, 'get_many', wraps=tiered.cache.get_many
+            ) as get_many:
+                self.assertEqual(cards.render(self.listing()), first)
+                tiered.local().clear()
+                self.assertEqual(cards.render(self.listing()), first)
+            self.assertEqual(render.call_count, settings.POSTS)
+            # Первый раз карточки нашлись в памяти процесса,
+            # второй — одним запросом к общему кэшу.
+            card_reads = [
+                call for call in get_many.call_args_list
+                if any(name.startswith('card:') for name in call.args[0])
+            ]
+            self.assertEqual(len(card_reads), 1)
+            self.assertEqual(
+                len(cards.render(self.listing(), True)), settings.POSTS
+            )
+            self.assertEqual(render.call_count, settings.POSTS * 2)
+
+    def test_cards_invalidated_on_changes(self):
+        """Правка поста, группы и имени автора обновляют карточки."""
+        cards.render(self.listing())
+        post = Post.objects.first()
+        post.text = 'edited_text'
+        post.save()
+        self.assertContains(self.author.get(INDEX_URL), 'edited_text')
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'new_title'
+        group.save()
+        self.assertContains(self.author.get(PROFILE_URL), '#new_title')
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = 'Новое'
+        user.save()
+        self.assertContains(self.author.get(INDEX_URL), 'Новое')
+        group.delete()
+        self.assertNotContains(self.author.get(PROFILE_URL), '#new_title')
+
+    def test_unrelated_changes_keep_caches(self):
+        """Сохранение пользователя без смены имени не сбрасывает кэш
+        лент, а переименование группы не переписывает ее посты."""
+        updated = list(Post.objects.values_list('updated_at', flat=True))
+        version = versions('posts')
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('new_password')
+        with mock.patch.object(tiered, 'invalidate') as invalidate:
+            user.save()
+        invalidate.assert_not_called()
+        self.assertEqual(versions('posts'), version)
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'new_title'
+        group.save()
+        self.assertEqual(
+            list(Post.objects.values_list('updated_at', flat=True)), updated
+        )
+
+    def test_renamed_author_profile(self):
+        """После смены логина старый адрес профиля не отвечает."""
+        self.author.get(PROFILE_URL)
+        user = User.objects.get(pk=self.user.pk)
+        user.username = 'renamed'
+        user.save()
+        self.assertEqual(self.author.get(PROFILE_URL).status_code, 404)
+        response = self.author.get(
+            reverse('posts:profile', args=['renamed'])
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_placeholder_cards_are_not_cached(self):
+        post = Post.objects.first()
+        post.image = SimpleUploadedFile(
+            name='small.gif', content=SMALL_GIF, content_type='image/gif'
+        )
+        with mock.patch.object(thumbnails, 'ready', return_value=False):
+            cards.render([post])
+        self.assertIsNone(cache.get(cards.key(post)))
+        post.image = None
+        cards.render([post])
+        self.assertIsNotNone(cache.get(cards.key(post)))
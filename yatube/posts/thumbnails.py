@@ -0,0 +1,285 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+Миниатюры из ``settings.POSTS_THUMBNAIL_PRESETS`` создаются пулом
+потоков после сохранения поста, а шаблоны только ищут готовую миниатюру
+в хранилище ключей sorl и никогда не масштабируют картинку во время
+запроса. Пока миниатюры нет, выводится заглушка, а создание миниатюры
+ставится в очередь.
+
+Готовая миниатюра сбрасывает кэш страниц с постами картинки и их
+копии на прокси, а когда готовы все варианты, их дата записывается
+в ``Post.images_ready_at``: страница поста проверяет готовность по ней,
+не обращаясь к хранилищу ключей. Миниатюра, которую не удалось
+создать, не ставится в очередь снова ``settings.POSTS_THUMBNAIL_RETRY``
+секунд.
+
+Для каждого пресета готовятся варианты нескольких ширин
+(``settings.POSTS_IMAGE_WIDTHS``) в исходном формате и в современных
+форматах из ``settings.POSTS_IMAGE_FORMATS``, которые поддерживает
+установленный Pillow. Из готовых вариантов собираются ``srcset``.
+"""
+import concurrent.futures
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.helpers import serialize, tokey
+from sorl.thumbnail.images import ImageFile
+
+from core import edge
+from core.cache import bump
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+
+class Placeholder:
+    """Заглушка с размерами миниатюры, пока та не готова."""
+
+    def __init__(self, geometry):
+        self.url = settings.POSTS_THUMBNAIL_PLACEHOLDER
+        self.width, _, self.height = geometry.partition('x')
+
+
+class CachedThumbnailBackend(ThumbnailBackend):
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        # sorl не знает расширения AVIF и других новых форматов Pillow.
+        if options['format'] in EXTENSIONS:
+            return super()._get_thumbnail_filename(
+                source, geometry_string, options
+            )
+        key = tokey(source.key, geometry_string, serialize(options))
+        return '%s%s/%s/%s.%s' % (
+            sorl_settings.THUMBNAIL_PREFIX, key[:2], key[2:4], key,
+            options['format'].lower()
+        )
+
+    def lookup(self, file_, geometry_string, **options):
+        """Готовая миниатюра из хранилища ключей или None."""
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+backend = CachedThumbnailBackend()
+_executor = None
+_pending = set()
+_futures = set()
+_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.POSTS_THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails'
+            )
+    return _executor
+
+
+@lru_cache()
+def formats():
+    """Современные форматы, которые умеет сохранять Pillow."""
+    Image.init()
+    return tuple(
+        format_ for format_ in settings.POSTS_IMAGE_FORMATS
+        if format_ in Image.SAVE
+    )
+
+
+def variants(preset):
+    """Пары (формат, геометрия, опции) всех вариантов пресета.
+
+    Формат None означает исходный формат картинки, его вариант
+    основной ширины совпадает с самим пресетом. Варианты шире пресета
+    не увеличивают картинку сверх ее размеров.
+    """
+    geometry, options = settings.POSTS_THUMBNAIL_PRESETS[preset]
+    width, height = (int(side) for side in geometry.split('x'))
+    for format_ in formats() + (None,):
+        for size in settings.POSTS_IMAGE_WIDTHS:
+            variant = dict(options)
+            if size > width:
+                variant['upscale'] = False
+            if format_ is not None:
+                variant['format'] = format_
+                variant['quality'] = settings.POSTS_IMAGE_QUALITY.get(
+                    format_, variant.get('quality')
+                )
+            yield format_, f'{size}x{round(height * size / width)}', variant
+
+
+def failure_key(name, preset):
+    # Имя файла может быть длиннее допустимого ключа memcached.
+    return 'thumbnail-failed:' + hashlib.md5(
+        f'{name}:{preset}'.encode()
+    ).hexdigest()
+
+
+def finished(name):
+    """Сбрасывает страницы с постами картинки: на них были заглушки."""
+    posts = list(
+        Post.objects.filter(image=name).only(
+            'pk', 'author', 'group', 'image'
+        )
+    )
+    if not posts:
+        return
+    if ready(posts[0].image):
+        Post.objects.filter(image=name, images_ready_at=None).update(
+            images_ready_at=timezone.now()
+        )
+    bump('index', *{
+        scope
+        for post in posts
+        for scope in (f'group:{post.group_id}', f'profile:{post.author_id}')
+    })
+    edge.purge('index', *edge.post_keys(posts))
+
+
+def render(name, preset):
+    try:
+        for _, geometry, options in variants(preset):
+            backend.get_thumbnail(name, geometry, **options)
+    except Exception:
+        logger.exception('Не удалось создать миниатюру %s (%s)', name, preset)
+        # Битая картинка не ставится в очередь на каждом просмотре.
+        cache.set(
+            failure_key(name, preset), True, settings.POSTS_THUMBNAIL_RETRY
+        )
+    else:
+        finished(name)
+    finally:
+        with _lock:
+            _pending.discard((name, preset))
+
+
+def render_in_worker(name, preset):
+    try:
+        render(name, preset)
+    finally:
+        # Соединения с базой у каждого потока пула свои.
+        connections.close_all()
+
+
+def submit(name, preset):
+    """Ставит миниатюру в очередь, повторные заявки и недавно
+    не удавшиеся миниатюры отбрасываются."""
+    with _lock:
+        if (name, preset) in _pending:
+            return
+        _pending.add((name, preset))
+    if cache.get(failure_key(name, preset)):
+        with _lock:
+            _pending.discard((name, preset))
+        return
+    if settings.POSTS_THUMBNAIL_PIPELINE == 'sync':
+        render(name, preset)
+        return
+    future = get_executor().submit(render_in_worker, name, preset)
+    with _lock:
+        _futures.add(future)
+    future.add_done_callback(_forget)
+
+
+def _forget(future):
+    with _lock:
+        _futures.discard(future)
+
+
+def wait(timeout=None):
+    """Дожидается миниатюр, уже поставленных в очередь: например,
+    перед удалением каталога, куда пул их пишет."""
+    with _lock:
+        futures = list(_futures)
+    concurrent.futures.wait(futures, timeout)
+
+
+def pregenerate(image):
+    """Заказывает все миниатюры картинки после фиксации транзакции."""
+    if not image:
+        return
+    name = image.name
+    for preset in settings.POSTS_THUMBNAIL_PRESETS:
+        transaction.on_commit(
+            lambda preset=preset: submit(name, preset)
+        )
+
+
+def lookup(image, preset):
+    """Миниатюра без масштабирования на пути запроса."""
+    if not image:
+        return None
+    geometry, options = settings.POSTS_THUMBNAIL_PRESETS[preset]
+    thumbnail = backend.lookup(image.name, geometry, **options)
+    if thumbnail is not None:
+        return thumbnail
+    name = image.name
+    transaction.on_commit(lambda: submit(name, preset))
+    return Placeholder(geometry)
+
+
+def ready(image):
+    """Готовы ли все варианты всех пресетов картинки."""
+    if not image:
+        return True
+    return all(
+        backend.lookup(image.name, geometry, **options) is not None
+        for preset in settings.POSTS_THUMBNAIL_PRESETS
+        for _, geometry, options in variants(preset)
+    )
+
+
+def sources(image, preset):
+    """Готовые варианты картинки для ``<source>`` и ``srcset``.
+
+    Возвращает список пар (MIME-тип, srcset); тип None у исходного
+    формата. Если готовы не все варианты, недостающие ставятся
+    в очередь, а на странице выводятся только готовые.
+    """
+    if not image:
+        return []
+    found = {}
+    missing = False
+    for format_, geometry, options in variants(preset):
+        thumbnail = backend.lookup(image.name, geometry, **options)
+        if thumbnail is None:
+            missing = True
+            continue
+        found.setdefault(format_, {}).setdefault(
+            thumbnail.width, thumbnail.url
+        )
+    if missing:
+        name = image.name
+        transaction.on_commit(lambda: submit(name, preset))
+    return [
+        (
+            f'image/{format_.lower()}' if format_ else None,
+            ', '.join(
+                f'{url} {width}w' for width, url in sorted(urls.items())
+            ),
+        )
+        for format_, urls in found.items()
+    ]
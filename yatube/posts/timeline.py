@@ -0,0 +1,151 @@
+"""Материализованная лента подписок.
+
+Новый пост раскладывается по лентам подписчиков при записи, поэтому
+чтение ленты сводится к выборке по индексу ``TimelineEntry.user``.
+Авторы, у которых подписчиков больше ``settings.FANOUT_LIMIT``,
+в ленты не раскладываются: их посты подмешиваются при чтении.
+
+Пропустив раскладку, автор получает флаг ``UserStats.celebrity``, и его
+посты подмешиваются и после того, как подписчиков станет меньше
+предела: иначе посты, не попавшие в ленты, из них бы пропали. Флаг
+снимают ``demote`` — раскладкой постов одного автора — и ``rebuild``,
+раскладывающий все посты заново; оба доступны через команду
+``rebuild_timeline``.
+
+Лента без подмешивания сортируется по дате из ``TimelineEntry``
+и читается одним проходом по индексу ``(user, -pub_date, -post)``.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+
+from .models import Follow, Post, TimelineEntry, UserStats
+
+
+def followers(author):
+    return Follow.objects.filter(author=author).values_list('user', flat=True)
+
+
+def celebrity():
+    """Условие на ``UserStats`` для авторов, посты которых
+    подмешиваются при чтении."""
+    return Q(celebrity=True) | Q(followers__gt=settings.FANOUT_LIMIT)
+
+
+def is_celebrity(author):
+    """Проверка перед раскладкой; пропуск раскладки ставит флаг."""
+    promoted = UserStats.objects.filter(
+        user=author, celebrity=False, followers__gt=settings.FANOUT_LIMIT
+    ).update(celebrity=True)
+    return bool(promoted) or UserStats.objects.filter(
+        user=author, celebrity=True
+    ).exists()
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты подписчиков автора."""
+    if is_celebrity(post.author_id):
+        return
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers(post.author_id)
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user, author):
+    """Заполняет ленту подписчика постами автора после подписки."""
+    if is_celebrity(author):
+        return
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user=user, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in author.posts.values_list(
+                'pk', 'pub_date'
+            )
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def prune(user, author):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(user=user, post__author=author).delete()
+
+
+def celebrities(user):
+    """Авторы из подписок пользователя, посты которых не раскладываются."""
+    return list(
+        UserStats.objects.filter(
+            celebrity(), user__following__user=user
+        ).values_list('user', flat=True)
+    )
+
+
+def feed(user):
+    """Лента подписок: материализованные записи плюс посты знаменитостей.
+
+    Посты размечены ``feed_date`` и ``feed_key`` — ключом сортировки
+    для ``CursorPaginator``.
+    """
+    merged = celebrities(user)
+    if not merged:
+        return Post.objects.filter(timeline__user=user).annotate(
+            feed_date=F('timeline__pub_date'),
+            feed_key=F('timeline__post'),
+        )
+    return Post.objects.filter(
+        Q(pk__in=TimelineEntry.objects.filter(user=user).values('post'))
+        | Q(author__in=merged)
+    ).annotate(feed_date=F('pub_date'), feed_key=F('pk'))
+
+
+def fill(condition, params):
+    """Раскладывает по лентам подписчиков посты авторов, подходящих под
+    условие на ``f`` (подписка) и ``s`` (счетчики автора); авторы без
+    строки счетчиков считаются обычными."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {TimelineEntry._meta.db_table} '
+            '(user_id, post_id, pub_date) '
+            'SELECT f.user_id, p.id, p.pub_date '
+            f'FROM {Follow._meta.db_table} f '
+            f'JOIN {Post._meta.db_table} p ON p.author_id = f.author_id '
+            f'LEFT JOIN {UserStats._meta.db_table} s '
+            'ON s.user_id = f.author_id '
+            f'WHERE (s.followers IS NULL OR s.followers <= %s) {condition}',
+            [settings.FANOUT_LIMIT, *params]
+        )
+        return cursor.rowcount
+
+
+def demote(author):
+    """Снимает флаг знаменитости с автора, у которого подписчиков
+    не больше предела, и раскладывает его посты по лентам.
+
+    Возвращает число добавленных записей или ``None``, если автор
+    остается знаменитостью.
+    """
+    with transaction.atomic():
+        demoted = UserStats.objects.filter(
+            user=author, celebrity=True,
+            followers__lte=settings.FANOUT_LIMIT
+        ).update(celebrity=False)
+        if not demoted:
+            return None
+        TimelineEntry.objects.filter(post__author=author).delete()
+        return fill('AND f.author_id = %s', [author.pk])
+
+
+def rebuild():
+    """Заново раскладывает посты по лентам всех подписчиков и снимает
+    флаг знаменитости с авторов, у которых подписчиков не больше
+    предела. Возвращает число записей в лентах."""
+    TimelineEntry.objects.all().delete()
+    UserStats.objects.update(celebrity=False)
+    UserStats.objects.filter(
+        followers__gt=settings.FANOUT_LIMIT
+    ).update(celebrity=True)
+    return fill('', [])
@@ -0,0 +1,122 @@
+"""Приём картинок постов.
+
+Загрузка пишется на диск порциями, поэтому память на одну загрузку
+ограничена размером порции и заголовка картинки. По первым байтам
+картинка опознаётся без декодирования: файлы больше
+``settings.POSTS_IMAGE_MAX_BYTES`` и картинки больше
+``settings.POSTS_IMAGE_MAX_PIXELS`` или ``settings.POSTS_IMAGE_MAX_SIDE``
+отбрасываются, не дочитываясь до конца. Принятая картинка один раз
+поворачивается по EXIF и сохраняется без метаданных.
+"""
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+TOO_LARGE = 'Файл больше {limit}.'
+TOO_MANY_PIXELS = 'Картинка больше {limit} точек или {side} точек по стороне.'
+
+
+def check_size(width, height):
+    """Текст ошибки, если размеры картинки вне лимитов, иначе None."""
+    side = settings.POSTS_IMAGE_MAX_SIDE
+    if (
+        width * height > settings.POSTS_IMAGE_MAX_PIXELS
+        or max(width, height) > side
+    ):
+        return TOO_MANY_PIXELS.format(
+            limit=settings.POSTS_IMAGE_MAX_PIXELS, side=side
+        )
+    return None
+
+
+def probe(header):
+    """Размеры картинки по заголовку или None, если байтов мало."""
+    try:
+        with Image.open(BytesIO(header)) as image:
+            return image.size
+    except Image.DecompressionBombError:
+        return Image.MAX_IMAGE_PIXELS, Image.MAX_IMAGE_PIXELS
+    except Exception:
+        return None
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку во временный файл и проверяет лимиты на лету.
+
+    Отвергнутый файл не прерывает запрос: дальнейшие порции
+    отбрасываются, а причина сохраняется в ``upload_error`` файла,
+    чтобы форма показала её как ошибку поля.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.header = b''
+        self.probed = False
+        self.error = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.error:
+            return None
+        self.received += len(raw_data)
+        if self.received > settings.POSTS_IMAGE_MAX_BYTES:
+            return self.reject(TOO_LARGE.format(
+                limit=filesizeformat(settings.POSTS_IMAGE_MAX_BYTES)
+            ))
+        if not self.probed:
+            self.header += raw_data[:settings.POSTS_IMAGE_HEADER_BYTES]
+            size = probe(self.header)
+            if size is not None:
+                self.probed = True
+                self.header = b''
+                error = check_size(*size)
+                if error:
+                    return self.reject(error)
+            elif len(self.header) >= settings.POSTS_IMAGE_HEADER_BYTES:
+                # Заголовок не опознан: решит проверка формы.
+                self.probed = True
+                self.header = b''
+        return super().receive_data_chunk(raw_data, start)
+
+    def reject(self, error):
+        self.error = error
+        self.file.truncate(0)
+        return None
+
+    def file_complete(self, file_size):
+        file = super().file_complete(0 if self.error else file_size)
+        file.upload_error = self.error
+        return file
+
+
+def normalize(upload):
+    """Поворачивает картинку по EXIF и убирает метаданные.
+
+    Картинки без EXIF и анимации остаются как есть, остальные
+    перекодируются в тот же временный файл загрузки.
+    """
+    upload.seek(0)
+    with Image.open(upload) as source:
+        if not source.getexif() or getattr(source, 'is_animated', False):
+            upload.seek(0)
+            return upload
+        format_ = source.format
+        params = {'format': format_, 'exif': b''}
+        if source.info.get('icc_profile'):
+            params['icc_profile'] = source.info['icc_profile']
+        if format_ == 'JPEG':
+            params['quality'] = settings.POSTS_IMAGE_UPLOAD_QUALITY
+        # Поворот загружает картинку целиком, после чего файл свободен.
+        normalized = ImageOps.exif_transpose(source)
+    normalized.info.pop('exif', None)
+    upload.seek(0)
+    upload.truncate()
+    normalized.save(upload, **params)
+    upload.size = upload.tell()
+    upload.seek(0)
+    upload.image = normalized
+    upload.content_type = Image.MIME.get(format_, upload.content_type)
+    return upload
@@ -1,35 +1,166 @@
+import hashlib
+
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
+from django.utils.dateparse import parse_date
+
+from core import edge, tiered
+from core.cache import changed_at, fetch, versions
+from core.http import etag, not_modified, set_validators
 
+from . import search, thumbnails, timeline
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post, User
+from .paginator import CursorPaginator, decode_cursor, encode_cursor
+
+AUTHOR_FIELDS = ('id', 'username', 'first_name', 'last_name')
 
 
-def get_page(request, queryset):
-    return Paginator(
+def get_page(request, queryset, cache_key=None, **ordering):
+    paginator = CursorPaginator(
         queryset,
-        settings.POSTS
-    ).get_page(request.GET.get('page'))
+        settings.POSTS,
+        approximate=settings.PAGINATOR_APPROXIMATE_COUNT,
+        **ordering
+    )
+
+    def build():
+        name, value = page_query(request)
+        if name == 'page':
+            return paginator.get_page(value)
+        if name == 'date':
+            return paginator.date_page(value)
+        return paginator.cursor_page(value)
+
+    if cache_key is None:
+        return build()
+    return paginator.restore_page(fetch(
+        f'page:{cache_key}',
+        lambda: paginator.page_state(build()),
+        settings.CACHE
+    ))
+
+
+def page_query(request):
+    """Параметр, выбирающий страницу ленты: ``(имя, значение)``.
+
+    Значения приведены к каноническому виду, неверные открывают первую
+    страницу, так что мусор в адресе не плодит записи кэша.
+    """
+    if 'page' in request.GET:
+        try:
+            return 'page', int(request.GET['page'])
+        except ValueError:
+            return 'page', 1
+    # Курсор ведет от страницы даты дальше и важнее самой даты.
+    if request.GET.get('cursor'):
+        decoded = decode_cursor(request.GET['cursor'])
+        return 'cursor', decoded and encode_cursor(*decoded)
+    try:
+        date = parse_date(request.GET.get('date', ''))
+    except ValueError:
+        date = None
+    if date is not None:
+        return 'date', date.isoformat()
+    return 'cursor', None
+
 
+def get_cache_key(request, *scopes):
+    """Ключ страницы ленты: области и их версии, страница и статус
+    входа. Версии — отметки времени и у разных областей могут
+    совпасть, поэтому имена областей тоже входят в ключ. Страница
+    входит в ключ хэшем, чтобы длина ключа не зависела от адреса."""
+    name, value = page_query(request)
+    return ':'.join((
+        *scopes,
+        versions('posts', *scopes),
+        hashlib.md5(f'{name}={value}'.encode()).hexdigest(),
+        str(int(request.user.is_authenticated)),
+    ))
 
+
+def get_group(slug):
+    group = tiered.get_or_set(
+        f'group:{slug}',
+        lambda: Group.objects.filter(slug=slug).first(),
+        settings.LOOKUP_CACHE,
+        scope='groups'
+    )
+    if group is None:
+        raise Http404
+    return group
+
+
+def get_author(username):
+    """Автор без счетчиков: в кэше лежат только поля профиля,
+    счетчики читаются при промахе кэша фрагмента профиля.
+    При промахе кэша автор выбирается сразу со счетчиками."""
+    key = f'author:{username}'
+    scope = f'user:{username}'
+    found = tiered.get_many([key], scope)
+    if key in found:
+        # Остальные поля отложены, как у выборки с only().
+        return User.from_db(None, AUTHOR_FIELDS, found[key])
+    author = User.objects.select_related('stats').only(
+        *AUTHOR_FIELDS, 'stats'
+    ).filter(username=username).first()
+    if author is None:
+        raise Http404
+    tiered.set_many(
+        {key: [getattr(author, field) for field in AUTHOR_FIELDS]},
+        settings.LOOKUP_CACHE,
+        scope
+    )
+    return author
+
+
+@edge.cacheable
 def index(request):
-    return render(request, 'posts/index.html', {
-        'page_obj': get_page(request, Post.objects.all()),
+    cache_key = get_cache_key(request, 'index')
+    validator = etag(cache_key, request.user.pk)
+    response = not_modified(request, validator)
+    if response is not None:
+        return response
+    page_obj = get_page(request, Post.objects.for_listing(), cache_key)
+    response = render(request, 'posts/index.html', {
+        'page_obj': page_obj,
     })
+    return edge.tag(
+        set_validators(response, validator),
+        'index', *edge.post_keys(page_obj)
+    )
 
 
+@edge.cacheable
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    return render(request, 'posts/group_list.html', {
+    group = get_group(slug)
+    cache_key = get_cache_key(request, f'group:{group.pk}')
+    validator = etag(cache_key, request.user.pk)
+    response = not_modified(request, validator)
+    if response is not None:
+        return response
+    page_obj = get_page(request, group.posts.for_listing(), cache_key)
+    response = render(request, 'posts/group_list.html', {
         'group': group,
-        'page_obj': get_page(request, group.posts.all()),
+        'page_obj': page_obj,
     })
+    return edge.tag(
+        set_validators(response, validator),
+        f'group-{group.pk}', *edge.post_keys(page_obj)
+    )
 
 
+@edge.cacheable
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_author(username)
+    cache_key = get_cache_key(request, f'profile:{author.pk}')
+    validator = etag(cache_key, request.user.pk)
+    response = not_modified(request, validator)
+    if response is not None:
+        return response
     following = (
         request.user.is_authenticated
         and request.user != author
@@ -37,17 +168,101 @@ def profile(request, username):
             user=request.user,
             author=author).exists()
     )
-    return render(request, 'posts/profile.html', {
+    page_obj = get_page(request, author.posts.for_listing(), cache_key)
+    response = render(request, 'posts/profile.html', {
         'author': author,
-        'page_obj': get_page(request, author.posts.all()),
-        'following': following
+        'page_obj': page_obj,
+        'following': following,
+        'cache_key': cache_key,
     })
+    return edge.tag(
+        set_validators(response, validator),
+        f'author-{author.pk}', *edge.post_keys(page_obj)
+    )
+
 
+def get_comments_page(request, post):
+    return CursorPaginator(
+        post.comments.select_related('author').only(
+            'text_html', 'created', 'post', 'author', 'author__username'
+        ),
+        settings.COMMENTS,
+        field='created'
+    ).cursor_page(request.GET.get('cursor'))
 
+
+@edge.cacheable
 def post_detail(request, post_id):
-    return render(request, 'posts/post_detail.html', {
-        'post': get_object_or_404(Post, pk=post_id),
+    # Счетчики автора и название группы входят в версии областей,
+    # правки поста и комментарии — в даты изменения, а готовность
+    # вариантов картинки — в дату готовности: до нее выводится исходник.
+    # Last-Modified — самая поздняя из дат, включая время версий.
+    state = get_object_or_404(
+        Post.objects.only(
+            'author_id', 'updated_at', 'comments_count', 'commented_at',
+            'images_ready_at'
+        ),
+        pk=post_id
+    )
+    version = versions('posts', f'profile:{state.author_id}')
+    last_modified = max(
+        date for date in (
+            state.updated_at,
+            state.commented_at,
+            state.images_ready_at,
+            changed_at(version),
+        ) if date
+    )
+    validator = etag(
+        post_id,
+        version,
+        state.updated_at,
+        state.comments_count,
+        state.commented_at,
+        state.images_ready_at,
+        request.GET.get('cursor', ''),
+        request.user.pk,
+    )
+    response = not_modified(request, validator, last_modified)
+    if response is not None:
+        return response
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'),
+        pk=post_id
+    )
+    comments = get_comments_page(request, post)
+    response = render(request, 'posts/post_detail.html', {
+        'post': post,
         'form': CommentForm(request.POST or None),
+        'comments': comments,
+    })
+    return edge.tag(
+        set_validators(response, validator, last_modified),
+        *edge.post_keys([post]),
+        *(f'author-{comment.author_id}' for comment in comments),
+    )
+
+
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments = get_comments_page(request, post)
+    return JsonResponse({
+        'html': render_to_string(
+            'posts/includes/comment_list.html',
+            {'post': post, 'comments': comments},
+            request=request
+        ),
+        'next_cursor': comments.next_cursor,
+    })
+
+
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    return render(request, 'posts/search.html', {
+        'query': query,
+        'page_obj': (
+            search.search(query, request.GET.get('cursor')) if query else None
+        ),
     })
 
 
@@ -64,6 +279,7 @@ def post_create(request):
     post = form.save(commit=False)
     post.author = request.user
     post.save()
+    thumbnails.pregenerate(post.image)
     return redirect('posts:profile', username=request.user.username)
 
 
@@ -84,6 +300,8 @@ def post_edit(request, post_id):
             {'post': post, 'form': form}
         )
     form.save()
+    if 'image' in form.changed_data:
+        thumbnails.pregenerate(post.image)
     return redirect('posts:post_detail', post.id)
 
 
@@ -103,14 +321,17 @@ def add_comment(request, post_id):
 def follow_index(request):
     return render(request, 'posts/follow.html', {
         'page_obj': get_page(
-            request, Post.objects.filter(author__following__user=request.user)
+            request,
+            timeline.feed(request.user).for_listing(),
+            field='feed_date',
+            key='feed_key'
         ),
     })
 
 
 @login_required
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_author(username)
     if author != request.user:
         Follow.objects.get_or_create(user=request.user, author=author)
     return redirect('posts:profile', username=author.username)
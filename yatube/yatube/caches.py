@@ -0,0 +1,58 @@
+"""Настройки кэша из переменных окружения.
+
+``CACHE_BACKEND`` выбирает хранилище:
+
+* ``locmem`` (по умолчанию) — память процесса, у каждого воркера своя;
+* ``sqlite`` — общий для процессов сервера файл SQLite;
+* ``file`` — общий каталог с файлами;
+* ``redis`` — Redis через ``django-redis``;
+* ``memcached`` — memcached через ``pylibmc``.
+
+``CACHE_LOCATION`` задает файл, каталог или адрес сервера. Значения
+длиннее ``CACHE_COMPRESS_MIN_LENGTH`` байт сжимаются zlib; пустое
+значение отключает сжатие.
+"""
+import os
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'sqlite': 'core.cache_backends.SQLiteCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django_redis.cache.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyLibMCCache',
+}
+
+
+def shared(environ=os.environ):
+    """Общий ли кэш для процессов сервера. Только в общем кэше версии
+    областей (``core.cache``) после записи видны всем воркерам."""
+    return environ.get('CACHE_BACKEND', 'locmem') != 'locmem'
+
+
+def cache(base_dir, environ=os.environ):
+    """Словарь для ``CACHES['default']``."""
+    name = environ.get('CACHE_BACKEND', 'locmem')
+    if name not in BACKENDS:
+        raise ValueError(
+            f'CACHE_BACKEND={name}: ожидается одно из {", ".join(BACKENDS)}'
+        )
+    locations = {
+        'locmem': '',
+        'sqlite': os.path.join(base_dir, 'cache.sqlite3'),
+        'file': os.path.join(base_dir, 'cache'),
+        'redis': 'redis://127.0.0.1:6379/1',
+        'memcached': '127.0.0.1:11211',
+    }
+    options = {'MAX_ENTRIES': int(environ.get('CACHE_MAX_ENTRIES', 100000))}
+    min_length = environ.get('CACHE_COMPRESS_MIN_LENGTH', '1024')
+    options.update(
+        BACKEND=BACKENDS[name],
+        # Файловый кэш Django сам сжимает значения zlib, обертка нужна
+        # ему только для счетчиков попаданий.
+        MIN_LENGTH=int(min_length) if min_length and name != 'file' else None,
+    )
+    return {
+        'BACKEND': 'core.cache_backends.CompressedCache',
+        'LOCATION': environ.get('CACHE_LOCATION', locations[name]),
+        'OPTIONS': options,
+    }
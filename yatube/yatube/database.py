@@ -0,0 +1,69 @@
+"""Настройки базы данных из переменных окружения.
+
+``DB_ENGINE`` выбирает профиль: ``sqlite`` (по умолчанию) или
+``postgresql``. Остальные переменные — ``DB_NAME``, ``DB_USER``,
+``DB_PASSWORD``, ``DB_HOST``, ``DB_PORT``, ``DB_CONN_MAX_AGE``
+и ``DB_CONNECT_TIMEOUT`` — необязательны. Параметры соединений
+с SQLite задаются в ``settings.SQLITE_PRAGMAS``.
+
+Реплика для чтения описывается теми же переменными с префиксом
+``DB_REPLICA_`` и подключается, если задана ``DB_REPLICA_NAME`` или
+``DB_REPLICA_HOST``; незаданные переменные берутся у основной базы.
+"""
+import os
+
+ENGINES = {
+    'sqlite': 'django.db.backends.sqlite3',
+    'postgresql': 'django.db.backends.postgresql',
+}
+
+
+def database(base_dir, environ=os.environ):
+    """Словарь для ``DATABASES['default']``.
+
+    Соединения переиспользуются между запросами ``DB_CONN_MAX_AGE``
+    секунд, а перед повторным использованием проверяются
+    (``CONN_HEALTH_CHECKS``, см. ``core.db``).
+    """
+    engine = environ.get('DB_ENGINE', 'sqlite')
+    if engine not in ENGINES:
+        raise ValueError(
+            f'DB_ENGINE={engine}: ожидается одно из {", ".join(ENGINES)}'
+        )
+    config = {
+        'ENGINE': ENGINES[engine],
+        'CONN_MAX_AGE': int(environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+    }
+    if engine == 'sqlite':
+        config['NAME'] = environ.get(
+            'DB_NAME', os.path.join(base_dir, 'db.sqlite3')
+        )
+        return config
+    config.update(
+        NAME=environ.get('DB_NAME', 'yatube'),
+        USER=environ.get('DB_USER', 'yatube'),
+        PASSWORD=environ.get('DB_PASSWORD', ''),
+        HOST=environ.get('DB_HOST', 'localhost'),
+        PORT=environ.get('DB_PORT', '5432'),
+        OPTIONS={
+            'connect_timeout': int(environ.get('DB_CONNECT_TIMEOUT', 5)),
+        },
+    )
+    return config
+
+
+def replica(base_dir, environ=os.environ):
+    """Словарь для ``DATABASES['replica']`` или None без реплики."""
+    prefix = 'DB_REPLICA_'
+    if not (environ.get(f'{prefix}NAME') or environ.get(f'{prefix}HOST')):
+        return None
+    merged = dict(environ)
+    merged.update(
+        (name.replace(prefix, 'DB_', 1), value)
+        for name, value in environ.items() if name.startswith(prefix)
+    )
+    config = database(base_dir, merged)
+    # В тестах реплика — та же база, что и основная.
+    config['TEST'] = {'MIRROR': 'default'}
+    return config
@@ -12,6 +12,9 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 
 import os
 
+from .caches import cache, shared
+from .database import database, replica
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -51,7 +54,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.SlowRequestMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
+    'core.middleware.EdgeCacheMiddleware',
+    'core.middleware.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -67,7 +75,7 @@ TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.templates.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -77,6 +85,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'core.context_processors.cache.cache_timeout',
             ],
         },
     },
@@ -89,10 +98,31 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    'default': database(BASE_DIR),
+}
+
+# Псевдонимы баз только для чтения, см. core.routers.
+DATABASE_REPLICAS = []
+
+if replica(BASE_DIR):
+    DATABASES['replica'] = replica(BASE_DIR)
+    DATABASE_REPLICAS.append('replica')
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# Сколько секунд после записи пользователь, а после сброса кэша все
+# запросы читают из основной базы; не меньше наибольшего отставания реплик.
+REPLICA_PIN_SECONDS = 10
+
+REPLICA_PIN_COOKIE = 'pin_primary'
+
+# Применяются к каждому новому соединению с SQLite.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,
+    'cache_size': -20000,
 }
 
 
@@ -146,6 +176,10 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 POSTS = 10
 
+COMMENTS = 20
+
+POSTS_TITLE_LENGTH = 30
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
@@ -153,15 +187,146 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    'default': cache(BASE_DIR),
 }
 
+# В кэше памяти процесса воркер не видит чужих сбросов версий, поэтому
+# страницы не получают ETag и не отвечают 304.
+CACHE_SHARED = shared()
+
 CACHE = 20
 
+CACHE_STALE = 60
+
+CACHE_LOCK_TIMEOUT = 10
+
+CACHE_LOCK_WAIT = 2
+
+CACHE_LOCK_POLL = 0.05
+
+CACHE_XFETCH_BETA = 1.0
+
+POSTS_CARD_CACHE = 60 * 60 * 24
+
+LOOKUP_CACHE = 60 * 60
+
+LOCAL_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+LOCAL_CACHE_TTL = 60
+
+LOCAL_CACHE_STAMP_TTL = 1
+
 POSTS_IMAGE_FOLDER = 'posts/'
 
+FILE_UPLOAD_HANDLERS = ['posts.uploads.LimitedUploadHandler']
+
+POSTS_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+
+POSTS_IMAGE_MAX_PIXELS = 25_000_000
+
+POSTS_IMAGE_MAX_SIDE = 8000
+
+POSTS_IMAGE_HEADER_BYTES = 64 * 1024
+
+POSTS_IMAGE_UPLOAD_QUALITY = 90
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+
+FANOUT_LIMIT = 5000
+
+PAGINATOR_APPROXIMATE_COUNT = False
+
+PAGINATOR_COUNT_LIMIT = 1000
+
+PAGINATOR_ON_EACH_SIDE = 3
+
+PAGINATOR_ON_ENDS = 2
+
+SEARCH_CONFIG = 'russian'
+
+SEARCH_BATCH = 500
+
+SEARCH_ADMIN_LIMIT = 1000
+
+POSTS_THUMBNAIL_PRESETS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True, 'quality': 85}),
+}
+
+POSTS_IMAGE_WIDTHS = (480, 960, 1440)
+
+POSTS_IMAGE_FORMATS = ('AVIF', 'WEBP')
+
+POSTS_IMAGE_QUALITY = {'AVIF': 60, 'WEBP': 80}
+
+POSTS_IMAGE_SIZES = '(min-width: 992px) 960px, 100vw'
+
+POSTS_THUMBNAIL_PIPELINE = 'thread'
+
+POSTS_THUMBNAIL_WORKERS = 2
+
+POSTS_THUMBNAIL_RETRY = 60 * 60
+
+POSTS_THUMBNAIL_PLACEHOLDER = (
+    'data:image/svg+xml,'
+    '%3Csvg xmlns=%22http://www.w3.org/2000/svg%22 viewBox=%220 0 960 339%22%3E'
+    '%3Crect width=%22100%25%22 height=%22100%25%22 fill=%22%23dee2e6%22/%3E'
+    '%3C/svg%3E'
+)
+
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# /metrics отвечает только на ``Authorization: Bearer <METRICS_TOKEN>``.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+COMPRESSION_ENCODINGS = ('br', 'gzip')
+
+COMPRESSION_LEVELS = {'br': 5, 'gzip': 6}
+
+COMPRESSION_MIN_LENGTH = 200
+
+COMPRESSION_CACHE_TIMEOUT = 60 * 60
+
+EDGE_CACHE_TIMEOUT = 60 * 60 * 24
+
+EDGE_BROWSER_CACHE_TIMEOUT = 0
+
+EDGE_PURGE_URL = os.environ.get('EDGE_PURGE_URL', '')
+
+EDGE_PURGE_TIMEOUT = 2
+
+SLOW_QUERY_SECONDS = float(os.environ.get('SLOW_QUERY_SECONDS', 0.1))
+
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', 0.5))
+
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+
+TRACEMALLOC_SAMPLE_RATE = float(os.environ.get('TRACEMALLOC_SAMPLE_RATE', 0))
+
+SLOW_LOG_FILE = os.environ.get(
+    'SLOW_LOG_FILE', os.path.join(BASE_DIR, 'slow.log')
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'slow': {
+            'class': 'logging.handlers.WatchedFileHandler',
+            'filename': SLOW_LOG_FILE,
+            'formatter': 'message',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'core.slow': {
+            'handlers': ['slow'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}